@@ -0,0 +1,47 @@
+import asyncio
+import inspect
+
+
+class ActorPool:
+    # Mỗi bàn (key) có một hàng đợi và một worker riêng: các thay đổi của cùng một bàn được áp dụng
+    # lần lượt theo thứ tự bấm, còn các bàn khác nhau vẫn chạy song song, không dùng khoá chung
+    def __init__(self, idle_timeout=60):
+        self.idle_timeout = idle_timeout  # Worker tự thoát sau khoảng này nếu bàn không còn việc
+        self.queues = {}
+        self.workers = {}
+
+    def __len__(self):
+        return len(self.queues)
+
+    def submit(self, key, action, *args):
+        # Đưa action(*args) vào hàng đợi của bàn, trả về future chứa kết quả
+        queue = self.queues.get(key)
+        if queue is None:
+            queue = self.queues[key] = asyncio.Queue()
+            self.workers[key] = asyncio.create_task(self._work(key, queue))
+        future = asyncio.get_running_loop().create_future()
+        queue.put_nowait((action, args, future))
+        return future
+
+    async def _work(self, key, queue):
+        while True:
+            try:
+                action, args, future = await asyncio.wait_for(queue.get(), self.idle_timeout)
+            except asyncio.TimeoutError:
+                if queue.empty():
+                    del self.queues[key]
+                    del self.workers[key]
+                    return
+                continue
+            if future.cancelled():
+                continue
+            try:
+                result = action(*args)
+                if inspect.isawaitable(result):
+                    result = await result
+            except Exception as e:
+                if not future.cancelled():
+                    future.set_exception(e)
+            else:
+                if not future.cancelled():
+                    future.set_result(result)
@@ -0,0 +1,185 @@
+import random
+
+# Bộ bài 52 lá (13 giá trị x 4 chất). Mỗi lá là một số nguyên 0..51: chất = lá // 13, giá trị = lá % 13
+SUITS = ["rô", "bích", "chuồn", "tép"]
+VALUES = ["A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K"]
+DECK = list(range(len(SUITS) * len(VALUES)))
+
+# Bảng tra cứu tính sẵn cho từng lá: tên hiển thị, điểm (A tính riêng nên để 0) và cờ lá A
+CARD_NAMES = [f"{VALUES[card % 13]} {SUITS[card // 13]}" for card in DECK]
+CARD_POINTS = [min(card % 13 + 1, 10) if card % 13 else 0 for card in DECK]
+CARD_IS_ACE = [1 if card % 13 == 0 else 0 for card in DECK]
+
+# Số lá tối đa trên một tay
+MAX_HAND_CARDS = 5
+
+
+def _ace_score(hard, aces):
+    # Tính điểm cho các lá A, ưu tiên giá trị 11, 10, hoặc 1 sao cho có lợi nhất (≤ 21)
+    score = hard
+    for _ in range(aces):
+        if score + 11 <= 21:
+            score += 11
+        elif score + 10 <= 21:
+            score += 10
+        else:
+            score += 1
+    return score
+
+
+# SCORE_TABLE[số lá A][tổng điểm các lá không phải A] -> điểm cuối cùng của tay bài
+SCORE_TABLE = [
+    [_ace_score(hard, aces) for hard in range(10 * MAX_HAND_CARDS + 1)]
+    for aces in range(MAX_HAND_CARDS + 1)
+]
+
+
+# Loại kết quả của một tay bài khi chốt ván
+XI_BANG = "xi_bang"  # 2 lá A
+XI_DACH = "xi_dach"  # A + 10/J/Q/K
+NGU_LINH = "ngu_linh"  # 5 lá, không quá 21
+QUAC = "quac"  # Quá 21 điểm
+NON = "non"  # Chưa đủ tuổi (dưới mức tối thiểu)
+DIEM = "diem"  # Tính theo tổng điểm
+
+
+class Hand:
+    # Tay bài giữ tổng điểm (không tính A) và số lá A, cập nhật dần khi thêm lá nên tính điểm là O(1)
+    __slots__ = ("cards", "hard", "aces", "outcome")
+
+    def __init__(self, cards=()):
+        self.cards = []
+        self.hard = 0
+        self.aces = 0
+        self.outcome = None  # (mức tối thiểu, loại, điểm) đã tính bởi classify()
+        for card in cards:
+            self.add(card)
+
+    def __len__(self):
+        return len(self.cards)
+
+    def __iter__(self):
+        return iter(self.cards)
+
+    def add(self, card):
+        self.cards.append(card)
+        self.hard += CARD_POINTS[card]
+        self.aces += CARD_IS_ACE[card]
+        self.outcome = None
+
+    def copy(self):
+        # Bản sao để hiển thị ngoài vùng thay đổi trạng thái của bàn
+        hand = Hand.__new__(Hand)
+        hand.cards = list(self.cards)
+        hand.hard = self.hard
+        hand.aces = self.aces
+        hand.outcome = self.outcome
+        return hand
+
+    @property
+    def score(self):
+        if self.aces < len(SCORE_TABLE) and self.hard < len(SCORE_TABLE[0]):
+            return SCORE_TABLE[self.aces][self.hard]
+        return _ace_score(self.hard, self.aces)
+
+    def classify(self, minimum):
+        # (loại, điểm) của tay bài khi chốt ván với mức tối thiểu `minimum`; tính một lần, giữ tới khi thêm lá
+        if self.outcome is None or self.outcome[0] != minimum:
+            score = self.score
+            if len(self.cards) == 2 and self.aces == 2:
+                kind = XI_BANG
+            elif len(self.cards) == 2 and self.aces == 1 and self.hard == 10:
+                kind = XI_DACH
+            elif len(self.cards) == MAX_HAND_CARDS and score <= 21:
+                kind = NGU_LINH
+            elif score > 21:
+                kind = QUAC
+            elif score < minimum:
+                kind = NON
+            else:
+                kind = DIEM
+            self.outcome = (minimum, kind, score)
+        return self.outcome[1], self.outcome[2]
+
+    def names(self):
+        # Chỉ dựng chuỗi hiển thị khi cần gửi tin nhắn
+        return [CARD_NAMES[card] for card in self.cards]
+
+    def numbered(self):
+        return "\n".join(f"{i+1}. {name}" for i, name in enumerate(self.names()))
+
+
+class Shoe:
+    # Hộp bài riêng của một ván: xào một lần rồi chia bằng pop() ở cuối danh sách (O(1) mỗi lá)
+    def __init__(self, decks=1, seed=None):
+        if seed is None:
+            seed = random.SystemRandom().randrange(2 ** 63)
+        self.decks = decks
+        self.seed = seed  # Lưu seed để có thể phát lại đúng thứ tự bài
+        self.rng = random.Random(seed)
+        self.shuffles = 0
+        self.cards = []
+        self.shuffle()
+
+    def __len__(self):
+        return len(self.cards)
+
+    def shuffle(self):
+        self.cards = DECK * self.decks
+        self.rng.shuffle(self.cards)
+        self.shuffles += 1
+
+    def state(self):
+        # Trạng thái gọn để lưu: seed + số lần xào + số lá còn lại là đủ dựng lại đúng hộp bài
+        return {"decks": self.decks, "seed": self.seed, "shuffles": self.shuffles, "remaining": len(self.cards)}
+
+    @classmethod
+    def from_state(cls, state):
+        shoe = cls(state["decks"], state["seed"])
+        while shoe.shuffles < state["shuffles"]:
+            shoe.shuffle()
+        del shoe.cards[state["remaining"]:]
+        return shoe
+
+    def draw(self):
+        if not self.cards:  # Dự phòng: hết bài giữa ván thì xào lại
+            self.shuffle()
+        return self.cards.pop()
+
+
+def calculate_score(hand):
+    return hand.score
+
+
+def check_special_hands(hand):
+    # Xì dách (A + 10/J/Q/K) hoặc Xì Bàng (2 lá A) ngay từ 2 lá đầu
+    if len(hand) != 2:
+        return False
+    return hand.aces == 2 or (hand.aces == 1 and hand.hard == 10)
+
+
+def check_xi_bang(hand):
+    return len(hand) == 2 and hand.aces == 2
+
+
+# Luật chốt ván, dùng chung cho bot và bộ mô phỏng (simulate.py)
+DEALER_STAND = 15  # Nhà cái rút thêm khi còn dưới mức này (và chưa đủ 5 lá)
+PLAYER_MIN = 16  # Người chơi cần ≥ 16 điểm mới được tính
+DEALER_MIN = 15  # Nhà cái cần ≥ 15 điểm mới được tính
+BUST = 21
+
+
+def dealer_draws(hand, stand=DEALER_STAND):
+    return hand.score < stand and len(hand) < MAX_HAND_CARDS
+
+
+def pick_winner(entries):
+    # entries: [(key, điểm, mức tối thiểu)] theo thứ tự người chơi rồi đến nhà cái.
+    # Người có điểm cao nhất (đủ tuổi, ≤ 21) thắng; bằng điểm thì người đứng trước thắng
+    winner = None
+    max_score = -1
+    for key, score, minimum in entries:
+        if minimum <= score <= BUST and score > max_score:
+            winner = key
+            max_score = score
+    return winner, max_score
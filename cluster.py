@@ -0,0 +1,110 @@
+import asyncio
+import os
+import signal
+import sys
+
+import aiohttp
+
+# Chạy bot ở chế độ cụm: tiến trình này chỉ làm điều phối, chia các shard thành nhiều dải liên tiếp
+# và chạy mỗi dải trong một tiến trình main.py riêng (mỗi tiến trình một event loop, một lõi CPU).
+# Sự kiện gateway của một guild luôn đến shard (guild_id >> 22) % shard_count, nên mọi kênh của guild đó,
+# cùng các bàn chơi trong kênh, thuộc về đúng một tiến trình.
+#
+#   XIDACH_PROCESSES=4 python cluster.py
+#
+# XIDACH_SHARD_COUNT để cố định số shard; bỏ trống thì lấy số shard Discord khuyến nghị.
+
+TOKEN = os.getenv("DISCORD_TOKEN")
+PROCESSES = int(os.getenv("XIDACH_PROCESSES", str(os.cpu_count() or 1)))
+SHARD_COUNT = os.getenv("XIDACH_SHARD_COUNT")
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+# Mỗi nhóm max_concurrency shard chỉ được IDENTIFY một lần mỗi 5 giây
+IDENTIFY_INTERVAL = 5
+RESTART_DELAY = 5
+
+
+def shard_ranges(shard_count, processes):
+    # Chia 0..shard_count-1 thành `processes` dải liên tiếp, chênh lệch nhau tối đa một shard
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    ranges = []
+    start = 0
+    for index in range(processes):
+        end = start + size + (1 if index < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+async def fetch_gateway():
+    # Hỏi Discord số shard khuyến nghị và giới hạn IDENTIFY đồng thời
+    async with aiohttp.ClientSession() as session:
+        async with session.get(
+            "https://discord.com/api/v10/gateway/bot", headers={"Authorization": f"Bot {TOKEN}"}
+        ) as response:
+            response.raise_for_status()
+            data = await response.json()
+    return data["shards"], data["session_start_limit"]["max_concurrency"]
+
+
+class Coordinator:
+    def __init__(self, shard_count, processes, max_concurrency=1):
+        self.shard_count = shard_count
+        self.ranges = shard_ranges(shard_count, processes)
+        self.max_concurrency = max_concurrency
+        self.procs = {}
+        self.stopping = False
+
+    def env(self, index):
+        env = dict(os.environ)
+        env["XIDACH_SHARD_COUNT"] = str(self.shard_count)
+        env["XIDACH_SHARD_IDS"] = ",".join(map(str, self.ranges[index]))
+        env["XIDACH_CLUSTER_INDEX"] = str(index)
+        return env
+
+    def identify_time(self, index):
+        # Thời gian các shard của một tiến trình cần để IDENTIFY xong, để tiến trình sau không tranh lượt
+        return IDENTIFY_INTERVAL * -(-len(self.ranges[index]) // self.max_concurrency)
+
+    async def supervise(self, index):
+        # Giữ tiến trình `index` luôn chạy, khởi động lại nếu nó thoát bất thường
+        while not self.stopping:
+            proc = await asyncio.create_subprocess_exec(sys.executable, MAIN, env=self.env(index))
+            self.procs[index] = proc
+            print(f"Cụm {index}: shard {self.ranges[index][0]}-{self.ranges[index][-1]} (pid {proc.pid})")
+            code = await proc.wait()
+            if self.stopping:
+                return
+            print(f"Cụm {index} đã thoát với mã {code}, khởi động lại sau {RESTART_DELAY} giây.")
+            await asyncio.sleep(RESTART_DELAY)
+
+    def stop(self):
+        self.stopping = True
+        for proc in self.procs.values():
+            if proc.returncode is None:
+                proc.terminate()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stop)
+        tasks = []
+        for index in range(len(self.ranges)):
+            if self.stopping:
+                break
+            tasks.append(asyncio.create_task(self.supervise(index)))
+            await asyncio.sleep(self.identify_time(index))
+        await asyncio.gather(*tasks)
+
+
+async def main():
+    if SHARD_COUNT:
+        shard_count, max_concurrency = int(SHARD_COUNT), 1
+    else:
+        shard_count, max_concurrency = await fetch_gateway()
+    await Coordinator(shard_count, PROCESSES, max_concurrency).run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
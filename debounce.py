@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+
+class EditDebouncer:
+    # Gộp các lần sửa cùng một tin nhắn: chỉ giữ nội dung + view mới nhất, sửa một lần cho cả hai,
+    # bỏ qua lần sửa không thay đổi gì và không sửa quá `rate` lần mỗi giây cho mỗi tin nhắn
+    def __init__(self, rate=1.0, on_edit=None):
+        self.min_interval = 1 / rate
+        self.on_edit = on_edit  # Gọi trước mỗi lần thực sự gửi request sửa (để đếm API)
+        self.pending = {}  # message.id -> (message, content, view, final)
+        self.applied = {}  # message.id -> (content, view) đã sửa gần nhất
+        self.last_edit = {}  # message.id -> thời điểm sửa gần nhất (time.monotonic)
+        self.tasks = {}
+        self.forgotten = set()  # Đã forget() khi còn đang sửa: dọn sau khi task sửa xong
+        self.edits = 0
+        self.skipped = 0
+
+    def update(self, message, content, view, final=False):
+        # final=True: đây là lần sửa cuối của tin nhắn, sửa xong thì quên luôn
+        if message.id in self.pending:
+            self.skipped += 1  # Lần sửa trước chưa kịp gửi đã bị gộp vào lần này
+        self.pending[message.id] = (message, content, view, final)
+        if message.id not in self.tasks:
+            self.tasks[message.id] = asyncio.create_task(self._flush(message.id))
+
+    def forget(self, message_id):
+        if message_id in self.tasks:
+            self.forgotten.add(message_id)
+        else:
+            self.applied.pop(message_id, None)
+            self.last_edit.pop(message_id, None)
+
+    async def _flush(self, key):
+        try:
+            while key in self.pending:
+                wait = self.last_edit.get(key, 0) + self.min_interval - time.monotonic()
+                # Luôn nhường một vòng lặp để gộp các cú bấm đến cùng lúc
+                await asyncio.sleep(max(wait, 0))
+                message, content, view, final = self.pending.pop(key)
+                if self.applied.get(key) == (content, view):
+                    self.skipped += 1
+                else:
+                    self.last_edit[key] = time.monotonic()
+                    self.applied[key] = (content, view)
+                    self.edits += 1
+                    if self.on_edit:
+                        self.on_edit()
+                    try:
+                        await message.edit(content=content, view=view)
+                    except Exception as e:
+                        print(f"Lỗi khi cập nhật tin nhắn {key}: {e}")
+                if final and key not in self.pending:
+                    self.applied.pop(key, None)
+                    self.last_edit.pop(key, None)
+        finally:
+            del self.tasks[key]
+            if key in self.forgotten:
+                self.forgotten.discard(key)
+                self.applied.pop(key, None)
+                self.last_edit.pop(key, None)
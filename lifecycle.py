@@ -0,0 +1,51 @@
+import asyncio
+import time
+
+
+class TableReaper:
+    # Một task nền duy nhất quét các bàn bị bỏ dở (không tạo mỗi bàn một task hẹn giờ)
+    def __init__(self, lobby_timeout, game_timeout, interval=30):
+        self.lobby_timeout = lobby_timeout
+        self.game_timeout = game_timeout
+        self.interval = interval
+        self.last_active = {}  # key -> thời điểm tương tác cuối (time.monotonic)
+        self.expired = 0
+        self.finished = 0
+
+    def touch(self, key):
+        self.last_active[key] = time.monotonic()
+
+    def forget(self, key, finished=True):
+        if self.last_active.pop(key, None) is not None and finished:
+            self.finished += 1
+
+    def stats(self):
+        return {"live": len(self.last_active), "expired": self.expired, "finished": self.finished}
+
+    async def sweep(self, in_lobby, expire):
+        # in_lobby(key) -> True nếu bàn còn ở phòng chờ; expire(key) là coroutine giải phóng bàn,
+        # trả về False nếu bàn đã không còn (vd. vừa kết thúc) để không bị đếm là đã dọn
+        now = time.monotonic()
+        stale = []
+        for key, last in self.last_active.items():
+            timeout = self.lobby_timeout if in_lobby(key) else self.game_timeout
+            if now - last >= timeout:
+                stale.append(key)
+        removed = 0
+        for key in stale:
+            del self.last_active[key]
+            try:
+                if await expire(key):
+                    removed += 1
+            except Exception as e:
+                print(f"Lỗi khi dọn bàn chơi {key}: {e}")
+        self.expired += removed
+        return removed
+
+    async def run(self, in_lobby, expire):
+        while True:
+            await asyncio.sleep(self.interval)
+            removed = await self.sweep(in_lobby, expire)
+            if removed:
+                stats = self.stats()
+                print(f"Đã dọn {removed} bàn không hoạt động. Còn {stats['live']} bàn, tổng đã dọn {stats['expired']}, đã kết thúc {stats['finished']}.")
@@ -1,458 +1,712 @@
 import discord
-from discord.ext.commands import Bot
-from discord import Intents
-from discord.ui import Button, View
+from discord.ext.commands import AutoShardedBot, Bot
+from discord import Intents, MemberCacheFlags, app_commands
+from discord.ui import Button, DynamicItem, View
 import os
-import random
 import uuid
 import asyncio
+import hashlib
+import json
+import signal
+
+from cards import (
+    BUST, DEALER_MIN, MAX_HAND_CARDS, NGU_LINH, NON, PLAYER_MIN, QUAC, XI_BANG, XI_DACH, calculate_score, check_special_hands,
+    check_xi_bang, pick_winner,
+)
+from store import WriteBehind, open_store
+from lifecycle import TableReaper
+from actors import ActorPool
+from debounce import EditDebouncer
+from tables import LOBBY, MAX_PLAYERS, PLAYING, Table, TableIndex
+from metrics import Registry, http_trace, serve, timed, watch_loop_lag
+from stats import open_stats, result_rows
+from timers import TimerHeap
 
 # Lấy token từ Secrets
 TOKEN = os.getenv("DISCORD_TOKEN")
 
+# Số bộ bài trong hộp bài của mỗi bàn (mỗi bàn chỉ chơi một ván nên hộp bài xào mới cho từng ván)
+SHOE_DECKS = int(os.getenv("XIDACH_DECKS", "1"))
+
+# Nơi lưu trạng thái bàn chơi: "sqlite:xidach.db" để giữ bàn qua các lần khởi động lại, bỏ trống thì chỉ giữ trong RAM
+STATE_DB = os.getenv("XIDACH_STATE_DB")
+
+# Nơi lưu kết quả các ván cho /stats và /leaderboard: "sqlite:xidach_stats.db", bỏ trống thì chỉ giữ trong RAM
+STATS_DB = os.getenv("XIDACH_STATS_DB")
+LEADERBOARD_SIZE = int(os.getenv("XIDACH_LEADERBOARD_SIZE", "10"))
+
+# Thời gian (giây) một bàn được phép không hoạt động trước khi bị dọn: ở phòng chờ và khi đang chơi
+LOBBY_TIMEOUT = float(os.getenv("XIDACH_LOBBY_TIMEOUT", "600"))
+GAME_TIMEOUT = float(os.getenv("XIDACH_GAME_TIMEOUT", "1800"))
+SWEEP_INTERVAL = float(os.getenv("XIDACH_SWEEP_INTERVAL", "30"))
+
+# Thời gian (giây) mỗi người chơi có để bốc / dừng, tính lại sau mỗi lần bốc; hết giờ thì tự động dừng. 0 để tắt
+TURN_TIMEOUT = float(os.getenv("XIDACH_TURN_TIMEOUT", "120"))
+
+# Số bàn tối đa được mở cùng lúc trong một kênh
+TABLES_PER_CHANNEL = int(os.getenv("XIDACH_TABLES_PER_CHANNEL", "5"))
+
+# Số request gửi song song tối đa khi phải gửi nhiều tin nhắn cùng lúc (bucket tin nhắn của một kênh là 5 lần/5 giây)
+FANOUT_LIMIT = int(os.getenv("XIDACH_FANOUT_LIMIT", "5"))
+
+# Số lần tối đa mỗi giây được sửa một tin nhắn phòng chờ (các lượt "Tham gia" dồn dập sẽ được gộp lại)
+LOBBY_EDIT_RATE = float(os.getenv("XIDACH_LOBBY_EDIT_RATE", "1"))
+
+# Chế độ shard: cluster.py đặt hai biến này cho từng tiến trình con (vd. XIDACH_SHARD_IDS="0,1,2", XIDACH_SHARD_COUNT="8").
+# Chỉ đặt XIDACH_SHARD_COUNT thì một tiến trình tự chạy toàn bộ shard.
+SHARD_COUNT = int(os.getenv("XIDACH_SHARD_COUNT", "0")) or None
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv("XIDACH_SHARD_IDS", "").split(",") if shard_id] or None
+
+# Cổng HTTP cục bộ xuất số đo dạng Prometheus (/metrics); bỏ trống thì không mở. Trong cụm, tiến trình thứ i dùng cổng + i
+METRICS_PORT = int(os.getenv("XIDACH_METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("XIDACH_METRICS_HOST", "127.0.0.1")
+CLUSTER_INDEX = int(os.getenv("XIDACH_CLUSTER_INDEX", "0"))
+
+# Hash của cây lệnh slash đã đồng bộ lần trước: chỉ gọi tree.sync() khi các lệnh thực sự thay đổi
+COMMAND_HASH_FILE = os.getenv(
+    "XIDACH_COMMAND_HASH_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".command_tree.hash")
+)
+
+# Khởi động gọn (mặc định bật): không xin intent members, không chunk và không cache thành viên,
+# vì trò chơi chỉ cần ID người chơi có sẵn trong tương tác. Đặt XIDACH_LEAN_START=0 để bật lại
+LEAN_START = os.getenv("XIDACH_LEAN_START", "1") != "0"
+
+# Số đo hiệu năng: thời gian callback, lời gọi REST (theo thao tác và theo route), số lần bị 429, độ trễ event loop
+registry = Registry()
+callback_seconds = registry.histogram("xidach_callback_seconds", "Thời gian xử lý callback của nút và lệnh", ("callback",))
+callback_errors = registry.counter("xidach_callback_errors_total", "Số callback kết thúc bằng lỗi", ("callback",))
+api_calls = registry.counter("xidach_api_calls_total", "Lời gọi API Discord theo thao tác của bot", ("action", "call"))
+rest_seconds = registry.histogram("xidach_rest_request_seconds", "Thời gian mỗi request REST tới Discord", ("method", "route"))
+rest_responses = registry.counter("xidach_rest_responses_total", "Số phản hồi REST theo mã trạng thái", ("method", "route", "status"))
+rate_limited = registry.counter("xidach_rate_limited_total", "Số lần Discord trả 429", ("route", "scope"))
+loop_lag = registry.histogram("xidach_event_loop_lag_seconds", "Độ trễ của event loop", buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1))
+loop_lag_last = registry.gauge("xidach_event_loop_lag_last_seconds", "Độ trễ event loop đo gần nhất")
+
 # Thiết lập intents
 intents = Intents.default()
 intents.message_content = True  # Cho phép bot đọc nội dung tin nhắn
-intents.members = True  # Cho phép bot theo dõi thành viên
+intents.members = not LEAN_START  # Cho phép bot theo dõi thành viên (intent đặc quyền, kéo theo chunk thành viên)
+
+bot_options = {
+    "command_prefix": "!",
+    "intents": intents,
+    "http_trace": http_trace(rest_seconds, rest_responses, rate_limited),
+}
+if LEAN_START:
+    bot_options["member_cache_flags"] = MemberCacheFlags.none()
+    bot_options["chunk_guilds_at_startup"] = False
 
 # Tạo bot
-bot = Bot(command_prefix="!", intents=intents)
+if SHARD_COUNT:
+    bot = AutoShardedBot(shard_count=SHARD_COUNT, shard_ids=SHARD_IDS, **bot_options)
+else:
+    bot = Bot(**bot_options)
 
-# Lưu trữ thông tin game (channel_id, participants, message, cards, decisions, game_id, player_messages, start_votes)
-games = {}
 
-# Bộ bài 52 lá (13 giá trị x 4 chất)
-SUITS = ["rô", "bích", "chuồn", "tép"]
-VALUES = ["A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K"]
-DECK = [f"{value} {suit}" for suit in SUITS for value in VALUES]
+def owns_guild(guild_id):
+    # Tiến trình này có giữ shard của guild không (tin nhắn riêng luôn đi qua shard 0)
+    if not SHARD_COUNT or SHARD_IDS is None:
+        return True
+    shard_id = (guild_id >> 22) % SHARD_COUNT if guild_id else 0
+    return shard_id in SHARD_IDS
 
-class StartButton(Button):
-    def __init__(self):
-        super().__init__(label="Bắt đầu", style=discord.ButtonStyle.success)
+# Các bàn đang mở (tables.Table), tra theo game_id / kênh / người chơi
+tables = TableIndex()
 
-    async def callback(self, interaction):
-        channel_id = interaction.channel_id
-        if channel_id not in games:
-            await interaction.response.send_message("Không có trò chơi nào đang diễn ra!", ephemeral=True)
-            return
 
-        user_id = interaction.user.id
-        if user_id not in games[channel_id]["participants"]:
-            await interaction.response.send_message("Bạn không tham gia trò chơi này!", ephemeral=True)
-            return
+def dump_game(game_id):
+    # Chuyển bàn chơi sang dạng JSON để lưu; trả về None nếu bàn không còn (sẽ bị xoá khỏi kho)
+    table = tables.get(game_id)
+    if table is None:
+        return None
+    return table.state()
+
+
+def load_game(state):
+    message = bot.get_partial_messageable(state["channel_id"]).get_partial_message(state["message_id"])
+    return Table.from_state(state, message)
+
+
+# Ghi trạng thái theo lô ở nền (write-behind) để nút bấm không bao giờ phải chờ ổ đĩa
+state_store = WriteBehind(open_store(STATE_DB), dump_game)
+
+# Kết quả từng ván: callback chỉ đẩy vào hàng chờ, task nền ghi theo lô; bảng xếp hạng đọc từ cache top-N
+game_stats = open_stats(STATS_DB, LEADERBOARD_SIZE)
+
+# Một task nền duy nhất dọn các bàn bị bỏ dở để bộ nhớ không tăng mãi
+reaper = TableReaper(LOBBY_TIMEOUT, GAME_TIMEOUT, SWEEP_INTERVAL)
+
+# Hạn lượt của mọi người chơi ((game_id, user_id) -> hạn) trong một heap, do một task nền duy nhất xử lý
+turn_timers = TimerHeap()
+
+# Mỗi bàn một hàng đợi + worker (theo game_id): mọi thay đổi của bàn đi qua đây theo đúng thứ tự bấm
+actors = ActorPool()
+
+# Đếm số lời gọi API Discord theo từng thao tác, vd. api_calls.get("stop", "edit_message"), để kiểm chứng số round-trip
+def count_api(action, call):
+    api_calls.inc(action, call)
+
+
+# Gộp các lần cập nhật tin nhắn phòng chờ thành một lần sửa (nội dung + view) và giới hạn tốc độ sửa
+lobby_editor = EditDebouncer(LOBBY_EDIT_RATE, on_edit=lambda: count_api("lobby", "edit"))
+
+
+def table_phases():
+    lobby = sum(1 for table in tables.values() if table.phase == LOBBY)
+    return {("lobby",): lobby, ("playing",): len(tables) - lobby}
+
 
-        if "start_votes" not in games[channel_id]:
-            games[channel_id]["start_votes"] = set()
-        games[channel_id]["start_votes"].add(user_id)
+# Các số đo này chỉ đọc trạng thái sẵn có lúc xuất, không thêm việc gì vào đường nóng
+registry.gauge("xidach_tables", "Số bàn đang mở theo giai đoạn", ("phase",), fn=table_phases)
+registry.counter(
+    "xidach_tables_closed_total", "Số bàn đã đóng theo lý do", ("reason",),
+    fn=lambda: {("expired",): reaper.expired, ("finished",): reaper.finished},
+)
+registry.gauge("xidach_turn_deadlines", "Số hạn lượt người chơi đang chờ", fn=lambda: len(turn_timers))
+turn_timeouts = registry.counter("xidach_turn_timeouts_total", "Số lượt người chơi bị tự động dừng do hết giờ")
+registry.gauge("xidach_actor_queues", "Số bàn đang có hàng đợi thao tác", fn=lambda: len(actors))
+registry.gauge("xidach_state_dirty", "Số bàn đang chờ ghi xuống kho", fn=lambda: len(state_store.dirty))
+registry.gauge("xidach_stats_pending", "Số kết quả đang chờ ghi xuống kho thống kê", fn=lambda: len(game_stats.pending))
+registry.counter(
+    "xidach_lobby_edits_total", "Lần sửa tin nhắn phòng chờ: đã gửi hoặc đã gộp", ("result",),
+    fn=lambda: {("sent",): lobby_editor.edits, ("coalesced",): lobby_editor.skipped},
+)
 
-        participant_count = len(games[channel_id]["participants"])
-        votes_count = len(games[channel_id]["start_votes"])
+# View phòng chờ của từng bàn (custom_id chứa game_id), dựng một lần và giữ tới khi bàn rời phòng chờ
+# để debouncer nhận ra lần sửa không đổi gì
+lobby_views = {}
 
-        if votes_count == participant_count:
+
+def lobby_view(game_id, can_start):
+    # Dựng lười (View cần event loop đang chạy) và chỉ dựng loại đang cần: chỉ "Tham gia",
+    # hoặc "Tham gia" + "Bắt đầu" + "Rời bàn" khi đã có người tham gia
+    views = lobby_views.setdefault(game_id, {})
+    view = views.get(can_start)
+    if view is None:
+        view = views[can_start] = View(timeout=None)
+        view.add_item(JoinButton(game_id))
+        if can_start:
+            view.add_item(StartButton(game_id))
+            view.add_item(LeaveButton(game_id))
+    return view
+
+
+async def reply(interaction, action, content):
+    # Trả lời ephemeral một lần cho tương tác
+    count_api(action, "send_message")
+    await interaction.response.send_message(content, ephemeral=True)
+
+
+def touch_game(game_id):
+    # Gọi sau mỗi lần thay đổi bàn: đánh dấu cần lưu và gia hạn thời gian không hoạt động
+    state_store.mark(game_id)
+    reaper.touch(game_id)
+
+
+def arm_turn(game_id, user_id):
+    # Đặt (lại) hạn lượt của người chơi; gọi khi chia bài và sau mỗi lần bốc
+    if TURN_TIMEOUT:
+        turn_timers.schedule((game_id, user_id), TURN_TIMEOUT)
+
+
+def cancel_turns(table):
+    for user_id in table.players:
+        turn_timers.cancel((table.game_id, user_id))
+
+
+def close_game(game_id):
+    # Giải phóng bàn đã có kết quả
+    table = tables.remove(game_id)
+    state_store.mark(game_id)
+    reaper.forget(game_id)
+    lobby_views.pop(game_id, None)
+    if table is not None:
+        cancel_turns(table)
+        lobby_editor.forget(table.message.id)
+
+
+async def expire_game(game_id):
+    # Bàn quá hạn: xoá trạng thái (trong hàng đợi của bàn) rồi gỡ các nút để không ai bấm vào bàn đã mất
+    table = await actors.submit(game_id, tables.remove, game_id)
+    state_store.mark(game_id)
+    lobby_views.pop(game_id, None)
+    if table is None:
+        return False
+    cancel_turns(table)
+    message = table.message
+    lobby_editor.update(message, "Bàn xì dách đã bị huỷ do không có ai hoạt động.", None, final=True)
+    for message_id in table.prompt_messages:
+        count_api("expire", "edit")
+        await message.channel.get_partial_message(message_id).edit(view=None)
+    return True
+
+# Các câu trả lời ephemeral khi thao tác không hợp lệ (theo mã trạng thái do các hàm apply_* trả về)
+REPLIES = {
+    "no_game": "Không có trò chơi nào đang diễn ra!",
+    "missing": "Không tìm thấy thông tin trận đấu. Vui lòng kiểm tra lại!",
+    "not_joined": "Bạn không tham gia trò chơi này!",
+    "joined": "Bạn đã tham gia rồi!",
+    "busy": "Bạn đang ở một bàn khác: hãy bấm 'Rời bàn' ở phòng chờ đó, hoặc chơi xong bàn đó trước!",
+    "full": f"Trò chơi đã đầy (tối đa {MAX_PLAYERS} người)!",
+    "started": "Trò chơi đã bắt đầu rồi!",
+    "no_cards": "Dữ liệu lá bài của bạn không sẵn sàng. Vui lòng bấm 'Bốc bài' để bắt đầu!",
+    "stopped": "Bạn đã chọn ngừng rồi. Vui lòng chờ kết quả!",
+    "max_cards": "Bạn đã có đủ 5 lá, hãy chọn 'Ngừng'.",
+}
+
+# Các hàm apply_* chỉ thay đổi trạng thái (không await) và luôn chạy trong hàng đợi riêng của bàn (actors),
+# rồi trả về bản sao cần thiết để callback gửi tin nhắn bên ngoài vùng thay đổi.
+
+def apply_join(game_id, user_id):
+    table = tables.get(game_id)
+    if table is None:
+        return "no_game", 0, None
+    if table.phase != LOBBY:
+        return "started", 0, None
+    if user_id in table.players:
+        return "joined", 0, None
+    if tables.of_user(user_id) is not None:
+        return "busy", 0, None
+    if table.full:
+        return "full", 0, None
+    table.join(user_id)
+    tables.bind(user_id, game_id)
+    touch_game(game_id)
+    return None, len(table.players), table.message
+
+def apply_leave(game_id, user_id):
+    # Rời phòng chờ để có thể tham gia bàn khác (mỗi người chỉ ở một bàn tại một thời điểm)
+    table = tables.get(game_id)
+    if table is None:
+        return "no_game", 0, None
+    if table.phase != LOBBY:
+        return "started", 0, None
+    if user_id not in table.players:
+        return "not_joined", 0, None
+    table.leave(user_id)
+    tables.unbind(user_id, game_id)
+    touch_game(game_id)
+    return None, len(table.players), table.message
+
+def apply_start_vote(game_id, user_id):
+    table = tables.get(game_id)
+    if table is None:
+        return "no_game", 0, 0, None
+    if user_id not in table.players:
+        return "not_joined", 0, 0, None
+    if table.phase != LOBBY:
+        return "started", 0, 0, None
+    everyone = table.vote(user_id)
+    touch_game(game_id)
+    # Chia bài ngay trong hàng đợi để hai lượt bấm cuối cùng không thể bắt đầu trò chơi hai lần
+    deal = deal_round(game_id) if everyone else None
+    return None, len(table.players), table.votes, deal
+
+def deal_round(game_id):
+    table = tables.get(game_id)
+    # Mỗi bàn dùng hộp bài riêng (tạo lúc chia), không ảnh hưởng tới các bàn khác đang chơi;
+    # nhà cái (bot) được chia 2 lá trước
+    table.deal(SHOE_DECKS)
+    touch_game(game_id)
+    lobby_editor.forget(table.message.id)  # Phòng chờ đã xong, không còn cập nhật tin nhắn này
+    lobby_views.pop(game_id, None)
+
+    # Nhà cái có Xì dách hoặc Xì Bàng thì thắng ngay, bàn kết thúc; người chơi chưa có bài, tính là thua
+    if table.phase != PLAYING:
+        outcomes = {user_id: (NON, 0) for user_id in table.players}
+        game_stats.record(result_rows(game_id, table.guild_id, table.channel_id, outcomes, "bot_dealer"))
+        close_game(game_id)
+    else:
+        for user_id in table.players:
+            arm_turn(game_id, user_id)
+    return game_id, list(table.players), table.dealer.copy()
+
+def check_player(table, user_id):
+    if table is None or table.phase != PLAYING:
+        return "missing", None
+    player = table.players.get(user_id)
+    if player is None:
+        return "not_joined", None
+    return None, player
+
+def apply_draw(game_id, user_id):
+    table = tables.get(game_id)
+    status, player = check_player(table, user_id)
+    if status is None and player.stopped:
+        status = "stopped"  # Kể cả khi bị tự động dừng do hết giờ trước khi bốc
+    if status:
+        return status, None, None, None
+    special_hand = None
+    done = False
+    # Bốc 2 lá ngay khi nhấn "Bốc bài"
+    if player.hand is None:
+        hand = table.open_hand(player)
+        touch_game(game_id)
+        arm_turn(game_id, user_id)
+        # Kiểm tra Xì dách hoặc Xì Bàng ngay sau khi bốc 2 lá
+        if check_special_hands(hand):
+            special_hand = "Xì Bàng" if check_xi_bang(hand) else "Xì dách"
+            done = apply_decision(game_id, player)
+    return None, player.hand.copy(), special_hand, done
+
+def check_hand(table, user_id):
+    status, player = check_player(table, user_id)
+    if status is None and player.hand is None:
+        status = "no_cards"
+    if status is None and player.stopped:
+        status = "stopped"
+    return status, player
+
+def apply_hit(game_id, user_id):
+    table = tables.get(game_id)
+    status, player = check_hand(table, user_id)
+    if status:
+        return status, None, False, False
+    hand = player.hand
+    if len(hand) >= MAX_HAND_CARDS:
+        # Kiểm tra Ngũ Linh khi có 5 lá
+        if calculate_score(hand) <= BUST:
+            return None, hand.copy(), True, apply_decision(game_id, player)
+        return "max_cards", None, False, False
+    table.hit(player)
+    touch_game(game_id)
+    arm_turn(game_id, user_id)
+    return None, hand.copy(), False, False
+
+def apply_stop(game_id, user_id):
+    table = tables.get(game_id)
+    status, player = check_hand(table, user_id)
+    if status:
+        return status, None, False
+    hand = player.hand.copy()
+    return None, hand, apply_decision(game_id, player)
+
+def apply_timeout(game_id, user_id):
+    # Hết giờ: người chơi chưa dừng được tự động dừng với số lá đang có (chưa bốc thì coi như không có bài)
+    table = tables.get(game_id)
+    if table is None or table.phase != PLAYING:
+        return None, False
+    player = table.players.get(user_id)
+    if player is None or player.stopped:
+        return None, False
+    return table.message, apply_decision(game_id, player)
+
+def apply_decision(game_id, player):
+    # Ghi nhận "Ngừng"; trả về True khi người cuối cùng vừa ngừng (lúc đó gọi play_dealer)
+    table = tables.get(game_id)
+    everyone = table.stop(player)
+    turn_timers.cancel((game_id, player.user_id))
+    touch_game(game_id)
+    return everyone
+
+def resolve_table(game_id):
+    # Chạy trong hàng đợi của bàn nên chỉ chốt đúng một lần, dù lượt dừng cuối và hết giờ đến cùng lúc
+    table = tables.get(game_id)
+    if table is None or table.phase != PLAYING or not all(player.stopped for player in table.players.values()):
+        return None
+    # Lượt của nhà cái (bot) rồi chốt kết quả từng tay; bản sao mang theo kết quả đã tính để announce_result chỉ việc đọc
+    table.resolve()
+    hands = {user_id: player.hand.copy() for user_id, player in table.players.items()}
+    outcomes = {user_id: hand.classify(PLAYER_MIN) for user_id, hand in hands.items()}
+    winner, _ = pick_winner(
+        [(user_id, score, PLAYER_MIN) for user_id, (_, score) in outcomes.items()]
+        + [("bot_dealer", table.dealer.classify(DEALER_MIN)[1], DEALER_MIN)]
+    )
+    game_stats.record(result_rows(game_id, table.guild_id, table.channel_id, outcomes, winner))
+    result = (table.message, game_id, table.dealer.copy(), hands)
+    close_game(game_id)  # Đã có kết quả, giải phóng bàn
+    return result
+
+# Mẫu tin nhắn kết quả, dựng sẵn một lần; người chơi được nhắc bằng <@id> nên không cần tra cứu user
+DEALER_NAME = "Nhà cái (Bot)"
+DEALER_NOTICES = {
+    XI_BANG: "Nhà cái (Bot) đã thắng ngay với Xì Bàng!",
+    XI_DACH: "Nhà cái (Bot) đã thắng ngay với Xì dách!",
+    NGU_LINH: "Nhà cái (Bot) đã thắng ngay với Ngũ Linh (Tổng: {score})!",
+}
+OUTCOME_TAGS = {XI_BANG: ", Xì Bàng", XI_DACH: ", Xì dách", NGU_LINH: ", Ngũ Linh", QUAC: ", quắc"}
+RESULT_HEADER = "Kết quả trò chơi (ID trận đấu: {game_id}):"
+RESULT_LINE = "{name}: {cards} (Tổng: {score}{tag})"
+RESULT_WINNER = "\nNgười thắng: {name} với tổng {score}!"
+RESULT_NO_WINNER = "\nKhông có người thắng (tất cả vượt quá 21 điểm hoặc không đủ tuổi)!"
+RESULT_NO_VALID = "Không có người chơi hoặc nhà cái nào đủ tuổi (≥ 16 cho người chơi, ≥ 15 cho nhà cái)! Trò chơi kết thúc mà không có người thắng."
+
+
+def render_result(game_id, dealer_cards, hands):
+    # Dựng tin nhắn công bố từ kết quả đã lưu trên từng tay bài (không tính lại điểm)
+    seats = [(f"<@{user_id}>", hand, PLAYER_MIN) for user_id, hand in hands.items()]
+    seats.append((DEALER_NAME, dealer_cards, DEALER_MIN))
+    entries = []
+    lines = [RESULT_HEADER.format(game_id=game_id)]
+    for name, hand, minimum in seats:
+        kind, score = hand.classify(minimum)
+        entries.append((name, score, minimum))
+        # Chỉ những người đủ tuổi (≥ 16 cho người chơi, ≥ 15 cho nhà cái) mới được tính
+        if score >= minimum:
+            lines.append(RESULT_LINE.format(name=name, cards=", ".join(hand.names()), score=score, tag=OUTCOME_TAGS.get(kind, "")))
+    if len(lines) == 1:
+        return RESULT_NO_VALID
+    winner, max_score = pick_winner(entries)
+    lines.append(RESULT_WINNER.format(name=winner, score=max_score) if winner else RESULT_NO_WINNER)
+    return "\n".join(lines)
+
+
+async def play_dealer(game_id):
+    # Lượt của nhà cái: chạy khi người cuối cùng dừng, bằng nút "Ngừng" hoặc do hết giờ
+    result = await actors.submit(game_id, resolve_table, game_id)
+    if result is not None:
+        await announce_result(result)
+
+
+async def turn_expired(key):
+    game_id, user_id = key
+    message, done = await actors.submit(game_id, apply_timeout, game_id, user_id)
+    if message is None:
+        return  # Người chơi đã dừng hoặc bàn đã kết thúc trước khi hạn được xử lý
+    turn_timeouts.inc()
+    count_api("timeout", "send")
+    await message.channel.send(f"<@{user_id}> đã hết giờ, tự động dừng.")
+    if done:
+        await play_dealer(game_id)
+
+
+async def announce_result(result):
+    message, game_id, dealer_cards, hands = result
+    channel = message.channel
+
+    # Xì dách, Xì Bàng, Ngũ Linh của nhà cái được báo riêng trước
+    kind, score = dealer_cards.classify(DEALER_MIN)
+    if kind in DEALER_NOTICES:
+        count_api("reveal", "send")
+        await channel.send(DEALER_NOTICES[kind].format(score=score))
+
+    count_api("reveal", "send")
+    await channel.send(render_result(game_id, dealer_cards, hands))
+
+# Các nút đều là DynamicItem: discord.py nhận diện chúng bằng mẫu custom_id đã đăng ký một lần trong setup_hook,
+# nên không phải lưu một View cho mỗi tin nhắn và nút vẫn hoạt động sau khi khởi động lại
+
+class StartButton(DynamicItem[Button], template=r"xidach_start_(?P<game_id>[0-9a-f-]+)"):
+    def __init__(self, game_id):
+        super().__init__(Button(label="Bắt đầu", style=discord.ButtonStyle.success, custom_id=f"xidach_start_{game_id}"))
+        self.game_id = game_id
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match["game_id"])
+
+    @timed(callback_seconds, callback_errors, "start")
+    async def callback(self, interaction):
+        status, participant_count, votes_count, deal = await actors.submit(self.game_id, apply_start_vote, self.game_id, interaction.user.id)
+        if status:
+            await reply(interaction, "start", REPLIES[status])
+            return
+
+        if deal is not None:
+            count_api("start", "defer")
             await interaction.response.defer()  # Báo cho Discord rằng bot đang xử lý
-            message = games[channel_id]["message"]
-            await start_gameplay(interaction, channel_id, message)
+            await start_gameplay(interaction, deal)
+            count_api("start", "followup")
             followup_msg = await interaction.followup.send("Trò chơi đã bắt đầu! Nhấn nút 'Bốc bài' để nhận lá bài của bạn.", ephemeral=True)
-            await asyncio.sleep(2)  # Đợi 2 giây
-            await followup_msg.delete()  # Xóa tin nhắn ephemeral sau 2 giây
+            await followup_msg.delete(delay=2)  # Xóa tin nhắn ephemeral sau 2 giây (chạy nền, không chặn trò chơi)
         else:
-            await interaction.response.send_message(
-                f"Bạn đã nhấn 'Bắt đầu'. Cần {participant_count} người tham gia nhấn nút để bắt đầu trò chơi. Hiện có {votes_count}/{participant_count} người.",
-                ephemeral=True
+            await reply(
+                interaction, "start",
+                f"Bạn đã nhấn 'Bắt đầu'. Cần {participant_count} người tham gia nhấn nút để bắt đầu trò chơi. Hiện có {votes_count}/{participant_count} người."
             )
 
-class JoinButton(Button):
-    def __init__(self):
-        super().__init__(label="Tham gia", style=discord.ButtonStyle.primary)
+class JoinButton(DynamicItem[Button], template=r"xidach_join_(?P<game_id>[0-9a-f-]+)"):
+    def __init__(self, game_id):
+        super().__init__(Button(label="Tham gia", style=discord.ButtonStyle.primary, custom_id=f"xidach_join_{game_id}"))
+        self.game_id = game_id
 
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match["game_id"])
+
+    @timed(callback_seconds, callback_errors, "join")
     async def callback(self, interaction):
-        channel_id = interaction.channel_id
-        if channel_id not in games:
-            await interaction.response.send_message("Không có trò chơi nào đang diễn ra!", ephemeral=True)
+        status, participant_count, message = await actors.submit(self.game_id, apply_join, self.game_id, interaction.user.id)
+        if status:
+            await reply(interaction, "join", REPLIES[status])
             return
 
-        user_id = interaction.user.id
-        if user_id in games[channel_id]["participants"]:
-            await interaction.response.send_message("Bạn đã tham gia rồi!", ephemeral=True)
-            return
+        # Cập nhật nội dung và thêm nút "Bắt đầu" trong cùng một lần sửa (không cần 2 người nữa vì bot là nhà cái);
+        # nhiều lượt tham gia dồn dập sẽ được gộp thành một lần sửa
+        lobby_editor.update(
+            message,
+            f"Tham gia chơi xì dách\nHiện có {participant_count} người tham gia\nNhấn 'Bắt đầu' để chơi.",
+            lobby_view(self.game_id, participant_count >= 1),
+        )
+        await reply(interaction, "join", f"Bạn đã tham gia trò chơi! Hiện có {participant_count} người tham gia.")
 
-        if len(games[channel_id]["participants"]) >= 5:
-            await interaction.response.send_message("Trò chơi đã đầy (tối đa 5 người)!", ephemeral=True)
-            return
+class LeaveButton(DynamicItem[Button], template=r"xidach_leave_(?P<game_id>[0-9a-f-]+)"):
+    def __init__(self, game_id):
+        super().__init__(Button(label="Rời bàn", style=discord.ButtonStyle.secondary, custom_id=f"xidach_leave_{game_id}"))
+        self.game_id = game_id
 
-        games[channel_id]["participants"].add(user_id)
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match["game_id"])
 
-        participant_count = len(games[channel_id]["participants"])
-        message = games[channel_id]["message"]
-        await message.edit(content=f"Tham gia chơi xì dách\nHiện có {participant_count} người tham gia\nNhấn 'Bắt đầu' để chơi.")
-        await interaction.response.send_message(
-            f"Bạn đã tham gia trò chơi! Hiện có {participant_count} người tham gia.", ephemeral=True
-        )
+    @timed(callback_seconds, callback_errors, "leave")
+    async def callback(self, interaction):
+        status, participant_count, message = await actors.submit(self.game_id, apply_leave, self.game_id, interaction.user.id)
+        if status:
+            await reply(interaction, "leave", REPLIES[status])
+            return
 
-        # Nếu đủ 1 người, thêm nút "Bắt đầu" vào view hiện tại (không cần 2 người nữa vì bot là nhà cái)
-        if participant_count >= 1:
-            view = discord.ui.View(timeout=None)
-            view.add_item(JoinButton())  # Giữ nút "Tham gia"
-            view.add_item(StartButton())  # Thêm nút "Bắt đầu"
-            await message.edit(view=view)  # Chỉnh sửa view của tin nhắn gốc
+        # Nếu những người còn lại đều đã bấm "Bắt đầu", một người bấm lại là đủ để chia bài
+        lobby_editor.update(
+            message,
+            f"Tham gia chơi xì dách\nHiện có {participant_count} người tham gia\nNhấn 'Bắt đầu' để chơi.",
+            lobby_view(self.game_id, participant_count >= 1),
+        )
+        await reply(interaction, "leave", f"Bạn đã rời bàn. Hiện còn {participant_count} người tham gia.")
 
-class DrawButton(Button):
-    def __init__(self, user_id, game_id):
-        super().__init__(label="Bốc bài", style=discord.ButtonStyle.primary, custom_id=f"draw_{user_id}_{game_id}")
+class DrawButton(DynamicItem[Button], template=r"draw_(?P<user_id>[0-9]+)_(?P<game_id>[0-9a-f-]+)"):
+    def __init__(self, user_id, game_id, label="Bốc bài"):
+        super().__init__(Button(label=label, style=discord.ButtonStyle.primary, custom_id=f"draw_{user_id}_{game_id}"))
         self.user_id = user_id
         self.game_id = game_id  # Thêm game_id để nhận diện trận đấu
 
-    async def callback(self, interaction):
-        channel_id = interaction.channel_id
-        if channel_id not in games or "game_id" not in games[channel_id]:
-            await interaction.response.send_message("Không tìm thấy thông tin trận đấu. Vui lòng kiểm tra lại!", ephemeral=True)
-            return
-
-        # Kiểm tra game_id để đảm bảo tương tác đúng với trận đấu
-        if games[channel_id]["game_id"] != self.game_id:
-            await interaction.response.send_message("ID trận đấu không hợp lệ. Vui lòng kiểm tra lại!", ephemeral=True)
-            return
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(int(match["user_id"]), match["game_id"], label=item.label)
 
+    @timed(callback_seconds, callback_errors, "draw")
+    async def callback(self, interaction):
         user_id = interaction.user.id
         if user_id != self.user_id:
-            await interaction.response.send_message("Bốc nhầm r", ephemeral=True)
+            await reply(interaction, "draw", "Bốc nhầm r")
             return
 
-        if user_id not in games[channel_id]["participants"]:
-            await interaction.response.send_message("Bạn không tham gia trò chơi này!", ephemeral=True)
+        status, cards, special_hand, done = await actors.submit(self.game_id, apply_draw, self.game_id, user_id)
+        if status:
+            await reply(interaction, "draw", REPLIES[status])
             return
 
-        # Bốc 2 lá ngay khi nhấn "Bốc bài"
-        if "cards" not in games[channel_id] or user_id not in games[channel_id].get("cards", {}):
-            games[channel_id]["cards"][user_id] = []
-            for _ in range(2):  # Bốc 2 lá ngay lập tức
-                card = random.choice(DECK)
-                DECK.remove(card)
-                games[channel_id]["cards"][user_id].append(card)
-
-            # Kiểm tra Xì dách hoặc Xì Bàng ngay sau khi bốc 2 lá
-            if check_special_hands(games[channel_id]["cards"][user_id], 2):
-                cards_str = "\n".join([f"{i+1}. {card}" for i, card in enumerate(games[channel_id]["cards"][user_id])])
-                total = calculate_score(games[channel_id]["cards"][user_id])
-                special_hand = "Xì Bàng" if check_xi_bang(games[channel_id]["cards"][user_id]) else "Xì dách"
-                await interaction.response.send_message(
-                    f"Lá của bạn:\n{cards_str}\nTổng điểm: {total}\nBạn đã thắng ngay với {special_hand}!",
-                    ephemeral=True
-                )
-                games[channel_id]["decisions"][user_id] = "Ngừng"
-                if all(decision == "Ngừng" for decision in games[channel_id]["decisions"].values() if decision is not None):
-                    await end_game(channel_id, games[channel_id]["game_id"])
-                return
-
-        user = interaction.user
-        cards = games[channel_id]["cards"][user_id]
-        cards_str = "\n".join([f"{i+1}. {card}" for i, card in enumerate(cards)])
-        total = calculate_score(cards)
+        hand_text = f"Lá của bạn:\n{cards.numbered()}\nTổng điểm: {calculate_score(cards)}"
+        if special_hand:
+            await reply(interaction, "draw", f"{hand_text}\nBạn đã thắng ngay với {special_hand}!")
+            if done:
+                await play_dealer(self.game_id)
+            return
 
         view = View(timeout=None)
         view.add_item(CardButton("Bốc tiếp", user_id, self.game_id))  # Truyền game_id
         view.add_item(CardButton("Ngừng", user_id, self.game_id))  # Truyền game_id
 
-        try:
-            # Gửi tin nhắn ephemeral trong channel để ẩn bài (chỉ người chơi thấy)
-            msg = await interaction.response.send_message(
-                f"Lá của bạn:\n{cards_str}\nTổng điểm: {total}", view=view, ephemeral=True
-            )
-            # Lưu ID tin nhắn ephemeral để quản lý sau này
-            if channel_id not in games or "player_messages" not in games[channel_id]:
-                if channel_id not in games:
-                    games[channel_id] = {}
-                games[channel_id]["player_messages"] = {}
-            games[channel_id]["player_messages"][user_id] = msg.id
-        except Exception as e:
-            print(f"Lỗi khi gửi tin nhắn ephemeral cho {user.name}: {e}")
-            await interaction.followup.send(
-                f"Lá của bạn:\n{cards_str}\nTổng điểm: {total}", view=view, ephemeral=True
-            )
-            message = await interaction.original_response()
-            games[channel_id]["player_messages"][user_id] = message.id
+        # Gửi tin nhắn ephemeral trong channel để ẩn bài (chỉ người chơi thấy); các lần bấm sau sẽ sửa chính tin nhắn này
+        count_api("draw", "send_message")
+        await interaction.response.send_message(hand_text, view=view, ephemeral=True)
 
-class CardButton(Button):
+class CardButton(DynamicItem[Button], template=r"card_(?P<action>Bốc tiếp|Ngừng)_(?P<user_id>[0-9]+)_(?P<game_id>[0-9a-f-]+)"):
     def __init__(self, action, user_id, game_id):
-        super().__init__(label=action, style=discord.ButtonStyle.primary, custom_id=f"card_{action}_{user_id}_{game_id}")
+        super().__init__(Button(label=action, style=discord.ButtonStyle.primary, custom_id=f"card_{action}_{user_id}_{game_id}"))
         self.action = action
         self.user_id = user_id
         self.game_id = game_id  # Thêm game_id để nhận diện trận đấu
 
-    async def callback(self, interaction):
-        channel_id = interaction.channel_id
-        # Chỉ kiểm tra game_id, không báo lỗi "Không có trò chơi nào đang diễn ra!" nếu game_id hợp lệ
-        if channel_id not in games or "game_id" not in games[channel_id]:
-            await interaction.response.send_message("Không tìm thấy thông tin trận đấu. Vui lòng kiểm tra lại!", ephemeral=True)
-            return
-
-        # Kiểm tra game_id để đảm bảo tương tác đúng với trận đấu
-        if games[channel_id]["game_id"] != self.game_id:
-            await interaction.response.send_message("ID trận đấu không hợp lệ. Vui lòng kiểm tra lại!", ephemeral=True)
-            return
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match["action"], int(match["user_id"]), match["game_id"])
 
+    @timed(callback_seconds, callback_errors, lambda self: "hit" if self.action == "Bốc tiếp" else "stop")
+    async def callback(self, interaction):
+        # Nút nằm trên tin nhắn ephemeral chứa bài của người chơi, nên mỗi lần bấm chỉ cần một lời gọi
+        # interaction.response.edit_message để cập nhật tại chỗ (không fetch_message, không gửi thêm followup)
         user_id = interaction.user.id
         if user_id != self.user_id:
-            await interaction.response.send_message("Bốc nhầm r", ephemeral=True)
-            return
-
-        if user_id not in games[channel_id]["participants"]:
-            await interaction.response.send_message("Bạn không tham gia trò chơi này!", ephemeral=True)
-            return
-
-        # Kiểm tra xem 'cards' đã được khởi tạo chưa, nếu không thì bỏ qua thay vì báo lỗi
-        if "cards" not in games[channel_id] or user_id not in games[channel_id].get("cards", {}):
-            await interaction.response.send_message("Dữ liệu lá bài của bạn không sẵn sàng. Vui lòng bấm 'Bốc bài' để bắt đầu!", ephemeral=True)
+            await reply(interaction, "card", "Bốc nhầm r")
             return
 
-        user = interaction.user
         if self.action == "Bốc tiếp":
-            if len(games[channel_id]["cards"][user_id]) >= 5:
-                # Kiểm tra Ngũ Linh khi có 5 lá
-                total = calculate_score(games[channel_id]["cards"][user_id])
-                if len(games[channel_id]["cards"][user_id]) == 5 and total <= 21:
-                    cards_str = "\n".join([f"{i+1}. {card}" for i, card in enumerate(games[channel_id]["cards"][user_id])])
-                    await interaction.response.send_message(
-                        f"Lá của bạn:\n{cards_str}\nTổng điểm: {total}\nBạn đã thắng ngay với Ngũ Linh!",
-                        ephemeral=True
-                    )
-                    games[channel_id]["decisions"][user_id] = "Ngừng"
-                    if all(decision == "Ngừng" for decision in games[channel_id]["decisions"].values() if decision is not None):
-                        await end_game(channel_id, games[channel_id]["game_id"])
-                    return
-
-            await interaction.response.defer()  # Tránh timeout
-            card = random.choice(DECK)
-            DECK.remove(card)
-            games[channel_id]["cards"][user_id].append(card)
-
-            cards = games[channel_id]["cards"][user_id]  # Lấy toàn bộ lá bài để tính tổng điểm
-            total = calculate_score(cards)
-            cards_str = "\n".join([f"{i+1}. {card}" for i, card in enumerate(cards)])  # Hiển thị toàn bộ lá bài
-
-            view = View(timeout=None)
-            view.add_item(CardButton("Bốc tiếp", user_id, self.game_id))  # Truyền game_id
-            view.add_item(CardButton("Ngừng", user_id, self.game_id))  # Truyền game_id
-
-            try:
-                # Tạo tin nhắn ephemeral mới thay vì chỉnh sửa tin nhắn cũ
-                msg = await interaction.followup.send(
-                    f"Lá của bạn:\n{cards_str}\nTổng điểm: {total}", view=view, ephemeral=True
-                )
-                # Lưu ID tin nhắn ephemeral mới để quản lý
-                if channel_id not in games or "player_messages" not in games[channel_id]:
-                    if channel_id not in games:
-                        games[channel_id] = {}
-                    games[channel_id]["player_messages"] = {}
-                games[channel_id]["player_messages"][user_id] = msg.id
-            except Exception as e:
-                print(f"Lỗi khi gửi tin nhắn ephemeral mới cho {user.name}: {e}")
-                await interaction.followup.send(
-                    f"Lá của bạn:\n{cards_str}\nTổng điểm: {total}", view=view, ephemeral=True
-                )
-                message = await interaction.original_response()
-                games[channel_id]["player_messages"][user_id] = message.id
+            status, cards, ngu_linh, done = await actors.submit(self.game_id, apply_hit, self.game_id, user_id)
+            if status:
+                await reply(interaction, "hit", REPLIES[status])
+                return
+
+            hand_text = f"Lá của bạn:\n{cards.numbered()}\nTổng điểm: {calculate_score(cards)}"
+            count_api("hit", "edit_message")
+            if ngu_linh:
+                await interaction.response.edit_message(content=f"{hand_text}\nBạn đã thắng ngay với Ngũ Linh!", view=None)
+                if done:
+                    await play_dealer(self.game_id)
+            else:
+                await interaction.response.edit_message(content=hand_text)  # Giữ nguyên các nút
         else:  # Ngừng
-            await interaction.response.defer()
-            games[channel_id]["decisions"][user_id] = "Ngừng"
-            cards_str = "\n".join([f"{i+1}. {card}" for i, card in enumerate(games[channel_id]["cards"][user_id])])
-            total = calculate_score(games[channel_id]["cards"][user_id])
-
-            try:
-                # Chỉnh sửa tin nhắn ephemeral hiện tại của người chơi trong channel, xóa view
-                if channel_id in games and user_id in games[channel_id]["player_messages"]:
-                    message_id = games[channel_id]["player_messages"][user_id]
-                    message = await interaction.channel.fetch_message(message_id)
-                    await message.edit(
-                        content=f"Lá của bạn:\n{cards_str}\nTổng điểm: {total}",
-                        view=None
-                    )
-                else:
-                    # Nếu không tìm thấy tin nhắn, gửi tin nhắn ephemeral mới (dự phòng)
-                    await interaction.response.send_message(
-                        f"Lá của bạn:\n{cards_str}\nTổng điểm: {total}", ephemeral=True
-                    )
-            except Exception as e:
-                print(f"Lỗi khi chỉnh sửa tin nhắn ephemeral cho {user.name}: {e}")
-                await interaction.followup.send(
-                    f"Lá của bạn:\n{cards_str}\nTổng điểm: {total}", ephemeral=True
-                )
-
-            # Loại bỏ tự động xóa tin nhắn ephemeral sau 2 giây cho hành động "Ngừng"
-            await interaction.followup.send("Bạn đã chọn ngừng. Kiểm tra tin nhắn riêng trong channel để xem lá bài của bạn. Vui lòng chờ kết quả!", ephemeral=True)
-
-            # Kiểm tra nếu tất cả người chơi đã chọn "Ngừng" và đủ tuổi
-            all_stopped = all(decision == "Ngừng" for decision in games[channel_id]["decisions"].values() if decision is not None)
-            if all_stopped:
-                # Xử lý lượt của nhà cái (bot)
-                dealer_cards = games[channel_id]["cards"].get("bot_dealer", [])
-                if not dealer_cards:  # Nếu nhà cái chưa có bài, chia 2 lá
-                    for _ in range(2):
-                        card = random.choice(DECK)
-                        DECK.remove(card)
-                        dealer_cards.append(card)
-                    games[channel_id]["cards"]["bot_dealer"] = dealer_cards
-
-                dealer_total = calculate_score(dealer_cards)
-                while dealer_total < 15 and len(dealer_cards) < 5:  # Nhà cái rút thêm nếu < 15 điểm, tối đa 5 lá
-                    card = random.choice(DECK)
-                    DECK.remove(card)
-                    dealer_cards.append(card)
-                    dealer_total = calculate_score(dealer_cards)
-
-                # Kiểm tra Xì dách, Xì Bàng, Ngũ Linh cho nhà cái
-                if check_special_hands(dealer_cards, 2) and len(dealer_cards) == 2:
-                    reveal_text = "Nhà cái (Bot) đã thắng ngay với Xì Bàng!" if check_xi_bang(dealer_cards) else "Nhà cái (Bot) đã thắng ngay với Xì dách!"
-                    await games[channel_id]["message"].channel.send(reveal_text)
-                elif len(dealer_cards) == 5 and dealer_total <= 21:
-                    reveal_text = f"Nhà cái (Bot) đã thắng ngay với Ngũ Linh (Tổng: {dealer_total})!"
-                    await games[channel_id]["message"].channel.send(reveal_text)
-                else:
-                    games[channel_id]["cards"]["bot_dealer"] = dealer_cards
-
-                # Kiểm tra điểm của từng người chơi và nhà cái, chỉ những người đủ tuổi (≥ 16 cho người chơi, ≥ 15 cho nhà cái) mới được tính
-                valid_players = []
-                scores = {}
-                for user_id in participants:
-                    total = calculate_score(games[channel_id]["cards"].get(user_id, []))
-                    if total >= 16:  # Người chơi cần ≥ 16
-                        valid_players.append(user_id)
-                        scores[user_id] = total
-                dealer_total = calculate_score(games[channel_id]["cards"].get("bot_dealer", []))
-                if dealer_total >= 15:  # Nhà cái cần ≥ 15
-                    valid_players.append("bot_dealer")
-                    scores["bot_dealer"] = dealer_total
-
-                if not valid_players:
-                    await games[channel_id]["message"].channel.send("Không có người chơi hoặc nhà cái nào đủ tuổi (≥ 16 cho người chơi, ≥ 15 cho nhà cái)! Trò chơi kết thúc mà không có người thắng.")
-                else:
-                    reveal_text = f"Kết quả trò chơi (ID trận đấu: {game_id}):\n"
-                    max_score = -1
-                    winner = None
-                    for user_id in valid_players:
-                        if user_id == "bot_dealer":
-                            user_mention = "Nhà cái (Bot)"
-                            cards_str = ", ".join(games[channel_id]["cards"].get("bot_dealer", []))
-                        else:
-                            user_mention = bot.get_user(user_id).mention
-                            cards_str = ", ".join(games[channel_id]["cards"].get(user_id, []))
-                        score = scores[user_id]
-                        reveal_text += f"{user_mention}: {cards_str} (Tổng: {score})\n"
-                        if score <= 21 and score > max_score:
-                            max_score = score
-                            winner = user_id
-
-                    if winner:
-                        reveal_text += f"\nNgười thắng: {'Nhà cái (Bot)' if winner == 'bot_dealer' else bot.get_user(winner).mention} với tổng {max_score}!"
-                    else:
-                        reveal_text += "\nKhông có người thắng (tất cả vượt quá 21 điểm hoặc không đủ tuổi)!"
-
-                    await games[channel_id]["message"].channel.send(reveal_text)
-
-async def start_gameplay(interaction, channel_id, message):
-    global DECK
-    DECK = [f"{value} {suit}" for suit in SUITS for value in VALUES]
-    random.shuffle(DECK)
-
-    # Tạo ID duy nhất cho trận đấu
-    game_id = str(uuid.uuid4())
+            status, cards, done = await actors.submit(self.game_id, apply_stop, self.game_id, user_id)
+            if status:
+                await reply(interaction, "stop", REPLIES[status])
+                return
+
+            count_api("stop", "edit_message")
+            await interaction.response.edit_message(
+                content=f"Lá của bạn:\n{cards.numbered()}\nTổng điểm: {calculate_score(cards)}\nBạn đã chọn ngừng. Vui lòng chờ kết quả!",
+                view=None
+            )
+
+            # Người cuối cùng ngừng: nhà cái chơi và công bố kết quả
+            if done:
+                await play_dealer(self.game_id)
 
-    participants = games[channel_id]["participants"]
-    games[channel_id]["cards"] = {user_id: [] for user_id in participants}
-    games[channel_id]["cards"]["bot_dealer"] = []  # Thêm nhà cái bot
-    games[channel_id]["decisions"] = {user_id: None for user_id in participants}
-    games[channel_id]["decisions"]["bot_dealer"] = None  # Thêm quyết định cho nhà cái bot
-    games[channel_id]["game_id"] = game_id  # Lưu game_id
-    if "player_messages" not in games[channel_id]:
-        games[channel_id]["player_messages"] = {}
-
-    # Xử lý nhà cái (bot) trước
-    dealer_cards = []
-    for _ in range(2):  # Chia 2 lá cho nhà cái (bot)
-        card = random.choice(DECK)
-        DECK.remove(card)
-        dealer_cards.append(card)
-    games[channel_id]["cards"]["bot_dealer"] = dealer_cards
+async def start_gameplay(interaction, deal):
+    game_id, order, dealer_cards = deal
 
     # Kiểm tra Xì dách hoặc Xì Bàng cho nhà cái (bot)
-    if check_special_hands(dealer_cards, 2):
-        await interaction.channel.send(
-            "Nhà cái (Bot) đã thắng ngay với Xì Bàng!" if check_xi_bang(dealer_cards) else "Nhà cái (Bot) đã thắng ngay với Xì dách!"
-        )
-        games[channel_id]["decisions"]["bot_dealer"] = "Ngừng"
-        if all(decision == "Ngừng" for decision in games[channel_id]["decisions"].values() if decision is not None):
-            await end_game(channel_id, games[channel_id]["game_id"])
+    if check_special_hands(dealer_cards):
+        count_api("start", "send")
+        await interaction.channel.send(DEALER_NOTICES[dealer_cards.classify(DEALER_MIN)[0]])
         return
 
-    # Tạo view với nút "Bốc bài" cho người chơi (không cho nhà cái bot)
-    for user_id in participants:
-        user = bot.get_user(user_id)
-        view = View(timeout=None)
-        view.add_item(DrawButton(user_id, game_id))  # Thêm nút "Bốc bài" cho người chơi
-        try:
-            await interaction.channel.send(
-                f"{user.mention}, hãy nhấn nút 'Bốc bài' để bắt đầu trò chơi.", view=view
-            )
-        except Exception as e:
-            print(f"Lỗi khi gửi tin nhắn công khai cho {user.name}: {e}")
-            followup_msg = await interaction.followup.send(
-                f"{user.mention}, hãy nhấn nút 'Bốc bài' để bắt đầu trò chơi.", view=view, ephemeral=True
-            )
-            await asyncio.sleep(2)  # Đợi 2 giây
-            await followup_msg.delete()  # Xóa tin nhắn ephemeral sau 2 giây
-
+    # Gộp lời mời của mọi người chơi và bài nhà cái vào một tin nhắn: mỗi người một nút "Bốc bài" (tối đa 5 người, view chứa được 25 nút)
     # Hiển thị bài của nhà cái (bot) (ẩn 1 lá nếu cần, nhưng hiện tại hiển thị cả 2 lá để đơn giản)
-    dealer_cards = games[channel_id]["cards"]["bot_dealer"]
-    await interaction.channel.send(
-        f"Nhà cái (Bot): {', '.join(dealer_cards)} (Tổng: {calculate_score(dealer_cards)})"
+    view = View(timeout=None)
+    for i, user_id in enumerate(order):
+        view.add_item(DrawButton(user_id, game_id, label=f"Bốc bài ({i+1})"))
+    mentions = ", ".join(f"<@{user_id}> ({i+1})" for i, user_id in enumerate(order))
+    content = (
+        f"{mentions}: hãy nhấn nút 'Bốc bài' của mình để bắt đầu trò chơi.\n"
+        f"Nhà cái (Bot): {', '.join(dealer_cards.names())} (Tổng: {calculate_score(dealer_cards)})"
     )
-
-async def end_game(channel_id, game_id):
-    if channel_id not in games or games[channel_id]["game_id"] != game_id:
-        return  # Không làm gì nếu không tìm thấy trận đấu hợp lệ
-
-    # Xử lý đã được thực hiện trong callback của "Ngừng"
-
-def calculate_score(cards):
-    score = 0
-    aces = 0
-    for card in cards:
-        value = card.split()[0]
-        if value == "A":
-            aces += 1
-        elif value in ["K", "Q", "J"]:
-            score += 10
-        else:
-            score += int(value)
-
-    # Tính điểm cho các lá A, ưu tiên giá trị 11, 10, hoặc 1 sao cho có lợi nhất (≤ 21)
-    for _ in range(aces):
-        if score + 11 <= 21:
-            score += 11
-        elif score + 10 <= 21:
-            score += 10
-        else:
-            score += 1
-
-    return score
-
-def check_special_hands(cards, card_count):
-    if card_count != 2:
-        return False
-    if len(cards) != 2:
-        return False
-    value1, value2 = cards[0].split()[0], cards[1].split()[0]
-    if value1 == "A" and value2 in ["10", "J", "Q", "K"]:
-        return True
-    if value2 == "A" and value1 in ["10", "J", "Q", "K"]:
-        return True
-    return False
-
-def check_xi_bang(cards):
-    if len(cards) != 2:
-        return False
-    value1, value2 = cards[0].split()[0], cards[1].split()[0]
-    return value1 == "A" and value2 == "A"
+    try:
+        count_api("start", "send")
+        prompt = await interaction.channel.send(content, view=view)
+        await actors.submit(game_id, record_prompt_message, game_id, prompt.id)  # Lưu lại để gỡ nút khi bàn hết hạn
+    except Exception as e:
+        print(f"Lỗi khi gửi tin nhắn công khai cho bàn {game_id}: {e}")
+        # Dự phòng: gửi riêng cho từng người, song song nhưng có giới hạn
+        followups = []
+        for user_id in order:
+            count_api("start", "followup")
+            player_view = View(timeout=None)
+            player_view.add_item(DrawButton(user_id, game_id))
+            followups.append(interaction.followup.send(
+                f"<@{user_id}>, hãy nhấn nút 'Bốc bài' để bắt đầu trò chơi.", view=player_view, ephemeral=True
+            ))
+        for followup_msg in await fan_out(followups):
+            if isinstance(followup_msg, Exception):
+                print(f"Lỗi khi gửi tin nhắn ephemeral cho bàn {game_id}: {followup_msg}")
+            else:
+                await followup_msg.delete(delay=2)  # Xóa tin nhắn ephemeral sau 2 giây (chạy nền)
+
+def record_prompt_message(game_id, message_id):
+    table = tables.get(game_id)
+    if table is not None:
+        table.prompt_messages.append(message_id)
+        touch_game(game_id)
+
+async def fan_out(coros, limit=FANOUT_LIMIT):
+    # Chạy nhiều lời gọi API song song nhưng không quá `limit` request cùng lúc;
+    # discord.py tự xếp hàng các request theo bucket rate limit của từng kênh
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*(run(coro) for coro in coros), return_exceptions=True)
 
 @bot.tree.command(name="xidach", description="Bắt đầu trò chơi xì dách")
 async def xidach_slash(interaction: discord.Interaction):
@@ -462,35 +716,167 @@ async def xidach_slash(interaction: discord.Interaction):
 async def xidach(ctx):
     await start_game(ctx)
 
-async def start_game(ctx):
-    view = View(timeout=None)
-    view.add_item(JoinButton())
+@bot.tree.command(name="xidach_stats", description="Số đo hiệu năng của bot xì dách (quản trị viên)")
+@app_commands.default_permissions(administrator=True)
+async def xidach_stats(interaction: discord.Interaction):
+    phases = table_phases()
+    lines = [
+        f"Bàn: {phases['lobby',]} ở phòng chờ, {phases['playing',]} đang chơi, "
+        f"đã kết thúc {reaper.finished}, đã dọn {reaper.expired}",
+        f"Độ trễ event loop: {loop_lag_last.get() * 1000:.1f} ms (p99 ≤ {loop_lag.quantile(0.99) * 1000:g} ms)",
+        f"REST: {sum(rest_responses.values.values())} request, {sum(rate_limited.values.values())} lần bị 429",
+        "Callback (số lần, p50, p99, lỗi):",
+    ]
+    for (name,), (_, total, count) in sorted(callback_seconds.series.items()):
+        lines.append(
+            f"  {name}: {count}, ≤ {callback_seconds.quantile(0.5, name) * 1000:g} ms, "
+            f"≤ {callback_seconds.quantile(0.99, name) * 1000:g} ms, {callback_errors.get(name)}"
+        )
+    await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
+@bot.tree.command(name="stats", description="Thành tích xì dách của bạn (hoặc của người khác) trong server này")
+@app_commands.describe(member="Người muốn xem (bỏ trống để xem của bạn)")
+async def stats_slash(interaction: discord.Interaction, member: discord.User = None):
+    user = member or interaction.user
+    games, wins, busts, best, last = await game_stats.user(interaction.guild_id or 0, user.id)
+    if not games:
+        await interaction.response.send_message(f"<@{user.id}> chưa chơi ván xì dách nào ở đây.", ephemeral=True)
+        return
+    lines = [
+        f"Thành tích của <@{user.id}>: {games} ván, thắng {wins} ({wins / games:.0%}), quắc {busts}, "
+        f"điểm cao nhất {best}",
+        "Các ván gần nhất: " + ", ".join(
+            f"{'thắng' if won else 'thua'} {score}{OUTCOME_TAGS.get(kind, '')}" for score, kind, won in last
+        ),
+    ]
+    await interaction.response.send_message("\n".join(lines), ephemeral=True, allowed_mentions=discord.AllowedMentions.none())
+
+@bot.tree.command(name="leaderboard", description="Bảng xếp hạng xì dách của server theo số ván thắng")
+async def leaderboard_slash(interaction: discord.Interaction):
+    top = await game_stats.leaderboard(interaction.guild_id or 0)
+    if not top:
+        await interaction.response.send_message("Chưa có ván xì dách nào được ghi lại ở đây.", ephemeral=True)
+        return
+    lines = [f"Bảng xếp hạng xì dách (top {LEADERBOARD_SIZE}):"]
+    for place, (user_id, games, wins, _) in enumerate(top, 1):
+        lines.append(f"{place}. <@{user_id}>: {wins} thắng / {games} ván")
+    await interaction.response.send_message("\n".join(lines), allowed_mentions=discord.AllowedMentions.none())
+
+@timed(callback_seconds, callback_errors, "xidach")
+async def start_game(ctx, seed=None):
+    # seed: seed cố định cho hộp bài của bàn (chỉ replay.py truyền vào), bỏ trống thì ngẫu nhiên
+    channel_id = ctx.channel.id
+    is_interaction = isinstance(ctx, discord.Interaction)
+    if tables.count_in_channel(channel_id) >= TABLES_PER_CHANNEL:
+        content = f"Kênh này đã có {TABLES_PER_CHANNEL} bàn đang mở, hãy chờ một bàn kết thúc!"
+        count_api("xidach", "send")
+        if is_interaction:
+            await ctx.response.send_message(content, ephemeral=True)
+        else:
+            await ctx.send(content)
+        return
 
-    if isinstance(ctx, discord.Interaction):
-        await ctx.response.send_message("Tham gia chơi xì dách\nHiện có 0 người tham gia", view=view, ephemeral=False)
-        message = await ctx.original_response()
-    else:
-        message = await ctx.send("Tham gia chơi xì dách\nHiện có 0 người tham gia", view=view)
-
-    games[ctx.channel.id] = {
-        "participants": set(),
-        "message": message,
-        "cards": {},
-        "decisions": {},
-        "start_message": None,
-        "player_messages": {},
-        "start_votes": set(),
-        "game_id": None  # Khởi tạo game_id (sẽ được gán trong start_gameplay)
-    }
+    # ID bàn có ngay từ phòng chờ: mọi nút của bàn (kể cả "Tham gia", "Bắt đầu") mang ID này trong custom_id
+    game_id = str(uuid.uuid4())
+    table = Table(game_id, channel_id, ctx.guild.id if ctx.guild else None, seed=seed)
+    tables.add(table)  # Giữ chỗ trước khi gửi để không vượt quá số bàn mỗi kênh
+    view = lobby_view(game_id, False)
+
+    count_api("xidach", "send")
+    try:
+        if is_interaction:
+            # Tin nhắn vừa gửi có sẵn trong phản hồi, không cần gọi thêm original_response()
+            callback = await ctx.response.send_message("Tham gia chơi xì dách\nHiện có 0 người tham gia", view=view, ephemeral=False)
+            sent = callback.resource
+        else:
+            sent = await ctx.send("Tham gia chơi xì dách\nHiện có 0 người tham gia", view=view)
+    except Exception:
+        tables.remove(game_id)
+        lobby_views.pop(game_id, None)
+        raise
+    # Chỉ giữ tin nhắn dạng partial (kênh + ID), không giữ cả nội dung, embed và view của tin nhắn đã gửi
+    table.message = sent.channel.get_partial_message(sent.id)
+    touch_game(game_id)
 
 @bot.event
-async def on_ready():
-    print(f"Bot đã sẵn sàng! Đăng nhập với tên: {bot.user}")
+async def setup_hook():
+    # Nạp lại các bàn còn dở từ kho lưu trữ, rồi bật task ghi nền
+    try:
+        # Procfile (khi deploy / khởi động lại) và cluster.py dừng tiến trình bằng SIGTERM; bot.run chỉ tự bắt Ctrl+C.
+        # Đóng bot để bot.run trả về bình thường và các lần ghi cuối ở cuối file được chạy
+        bot.loop.add_signal_handler(signal.SIGTERM, lambda: bot.loop.create_task(bot.close()))
+    except NotImplementedError:
+        pass  # Windows không hỗ trợ add_signal_handler
+    backend = state_store.backend
+    rows = await asyncio.to_thread(backend.load) if backend.blocking else backend.load()
+    # Một bộ xử lý cho mỗi loại nút, dùng cho mọi tin nhắn (kể cả tin nhắn gửi trước khi khởi động lại)
+    bot.add_dynamic_items(JoinButton, StartButton, LeaveButton, DrawButton, CardButton)
+    for key, state in rows.items():
+        # Kho có thể dùng chung giữa các tiến trình của cụm: chỉ nạp các bàn thuộc shard của mình
+        if not owns_guild(state.get("guild_id")):
+            continue
+        try:
+            table = load_game(state)
+        except Exception as e:
+            print(f"Lỗi khi nạp lại bàn chơi {key}: {e}")
+            continue
+        game_id = table.game_id
+        tables.add(table)
+        for user_id in table.players:
+            tables.bind(user_id, game_id)
+        reaper.touch(game_id)
+        if table.phase == PLAYING:
+            for player in table.players.values():
+                if not player.stopped:
+                    arm_turn(game_id, player.user_id)  # Hạn lượt không được lưu: tính lại từ lúc khởi động
+    if rows:
+        print(f"Đã nạp lại {len(tables)} bàn chơi.")
+    bot.loop.create_task(state_store.run())
+    bot.loop.create_task(game_stats.run())
+    bot.loop.create_task(turn_timers.run(turn_expired))
+    bot.loop.create_task(reaper.run(lambda game_id: game_id in tables and tables.get(game_id).phase == LOBBY, expire_game))
+    bot.loop.create_task(watch_loop_lag(loop_lag, loop_lag_last))
+    if CLUSTER_INDEX == 0:  # Lệnh slash là toàn cục: trong cụm chỉ tiến trình đầu tiên đồng bộ
+        bot.loop.create_task(sync_commands())
+    if METRICS_PORT:
+        bot.loop.create_task(serve(registry, METRICS_HOST, METRICS_PORT + CLUSTER_INDEX))
+
+def command_tree_hash():
+    payload = [command.to_dict(bot.tree) for command in bot.tree.get_commands()]
+    data = json.dumps({"application_id": bot.application_id, "commands": payload}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+async def sync_commands():
+    # Chạy một lần mỗi tiến trình (từ setup_hook), không phải trong on_ready vì on_ready chạy lại mỗi lần kết nối lại
+    digest = command_tree_hash()
+    try:
+        with open(COMMAND_HASH_FILE, encoding="utf-8") as f:
+            if f.read().strip() == digest:
+                print("Lệnh slash không thay đổi, bỏ qua đồng bộ.")
+                return
+    except OSError:
+        pass
     try:
         synced = await bot.tree.sync()
-        print(f"Đã đồng bộ {len(synced)} lệnh slash.")
     except Exception as e:
-        print(e)
+        print(f"Lỗi khi đồng bộ lệnh slash: {e}")
+        return
+    print(f"Đã đồng bộ {len(synced)} lệnh slash.")
+    try:
+        with open(COMMAND_HASH_FILE, "w", encoding="utf-8") as f:
+            f.write(digest)
+    except OSError as e:
+        print(f"Không lưu được hash lệnh slash: {e}")
 
-# Chạy bot
-bot.run(TOKEN)
\ No newline at end of file
+@bot.event
+async def on_ready():
+    print(f"Bot đã sẵn sàng! Đăng nhập với tên: {bot.user}" + (f" (shard {SHARD_IDS or 'tất cả'}/{SHARD_COUNT})" if SHARD_COUNT else ""))
+
+# Chạy bot (import main từ replay.py thì không chạy)
+if __name__ == "__main__":
+    bot.run(TOKEN)
+    state_store.flush_sync()  # Ghi nốt trạng thái còn lại khi bot tắt
+    game_stats.flush_sync()
+    state_store.backend.close()
+    game_stats.store.close()
@@ -0,0 +1,220 @@
+import asyncio
+import functools
+import re
+import time
+
+import aiohttp
+
+# Số đo nhẹ cho đường nóng (không cần prometheus_client): bộ đếm, histogram và gauge giữ trong RAM,
+# xuất ra dạng văn bản Prometheus qua một HTTP endpoint cục bộ (serve) hoặc đọc trực tiếp cho lệnh admin.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    # fn (tuỳ chọn): hàm trả về giá trị hiện tại, hoặc dict {nhãn: giá trị}, đọc lúc xuất số đo
+    kind = "counter"
+
+    def __init__(self, name, help, labels=(), fn=None):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.fn = fn
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, *labels):
+        return self.values.get(labels, 0)
+
+    def items(self):
+        if self.fn is None:
+            return self.values.items()
+        value = self.fn()
+        return value.items() if isinstance(value, dict) else [((), value)]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in sorted(self.items()):
+            lines.append(f"{self.name}{_labels(self.labels, labels)} {_number(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self.series = {}  # nhãn -> [số lần theo từng bucket (không cộng dồn), tổng, số lần]
+
+    def observe(self, value, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][index] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def quantile(self, q, *labels):
+        # Ước lượng theo cận trên của bucket chứa phân vị q (đủ để nhìn nhanh trong lệnh admin)
+        series = self.series.get(labels)
+        if not series or not series[2]:
+            return 0.0
+        rank = q * series[2]
+        seen = 0
+        for bound, count in zip(self.buckets, series[0]):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        for labels, (counts, total, count) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                lines.append(f"{self.name}_bucket{_labels(names, labels + (_number(bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help, labels=(), fn=None):
+        return self._add(Counter(name, help, labels, fn))
+
+    def gauge(self, name, help, labels=(), fn=None):
+        return self._add(Gauge(name, help, labels, fn))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                print(f"Lỗi khi xuất số đo {metric.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+def timed(histogram, errors, label):
+    # Bọc một coroutine (callback của nút, lệnh): đo thời gian chạy và đếm lỗi.
+    # label là chuỗi, hoặc hàm nhận đối số đầu tiên (vd. self của nút) và trả về chuỗi
+    def decorate(callback):
+        @functools.wraps(callback)
+        async def wrapper(*args, **kwargs):
+            name = label(args[0]) if callable(label) else label
+            started = time.perf_counter()
+            try:
+                return await callback(*args, **kwargs)
+            except Exception:
+                errors.inc(name)
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - started, name)
+        return wrapper
+    return decorate
+
+
+# ID (snowflake) và token trong đường dẫn REST được thay bằng chỗ trống để gom nhãn theo route
+_ROUTE_PARAMS = re.compile(r"/(?:[0-9]{15,}|[A-Za-z0-9_.-]{60,})(?=/|$)")
+
+
+def route_of(url):
+    return _ROUTE_PARAMS.sub("/:id", re.sub(r"^/api/v[0-9]+", "", url.path))
+
+
+def http_trace(duration, responses, rate_limited):
+    # aiohttp.TraceConfig gắn vào phiên HTTP của discord.py (Bot(http_trace=...)): đo mọi request REST thật,
+    # kể cả các lần discord.py tự thử lại sau khi bị 429
+    trace = aiohttp.TraceConfig()
+
+    async def on_request_start(session, context, params):
+        context.started = time.perf_counter()
+
+    async def on_request_end(session, context, params):
+        route = route_of(params.url)
+        status = params.response.status
+        duration.observe(time.perf_counter() - context.started, params.method, route)
+        responses.inc(params.method, route, str(status))
+        if status == 429:
+            rate_limited.inc(route, params.response.headers.get("X-RateLimit-Scope", "unknown"))
+
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_end)
+    return trace
+
+
+async def watch_loop_lag(histogram, gauge, interval=0.5):
+    # Ngủ `interval` giây rồi đo phần trễ thêm: event loop càng bận thì trễ càng lớn
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(loop.time() - started - interval, 0.0)
+        histogram.observe(lag)
+        gauge.set(lag)
+
+
+async def serve(registry, host, port):
+    # HTTP tối giản: GET /metrics trả về số đo, đường dẫn khác trả 404
+    async def handle(reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readline(), 5)
+            while (await asyncio.wait_for(reader.readline(), 5)).strip():
+                pass  # Bỏ qua header
+            parts = request.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", registry.render().encode()
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    print(f"Số đo Prometheus tại http://{host}:{port}/metrics")
+    async with server:
+        await server.serve_forever()
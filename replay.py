@@ -0,0 +1,378 @@
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import re
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+
+import main
+from main import CardButton, DrawButton, JoinButton, StartButton
+
+# Đo hiệu năng luồng nút bấm (Tham gia -> Bắt đầu -> Bốc bài -> Bốc tiếp/Ngừng) mà không cần kết nối Discord.
+# Các đối tượng interaction/response/followup/channel giả chỉ ghi lại lời gọi API (có thể giả lập độ trễ mạng),
+# còn mọi callback, hàng đợi của bàn và luật chơi là code thật trong main.py.
+#
+#   python replay.py --tables 2000 --players 1-5            # luồng bấm ngẫu nhiên, in p50/p99 và bộ nhớ
+#   python replay.py --tables 100 --record clicks.jsonl     # ghi lại luồng bấm đã chạy
+#   python replay.py --script clicks.jsonl                  # phát lại đúng luồng bấm đó
+#
+# Mỗi dòng của luồng bấm: {"table": 0, "user": 1, "button": "join|start|draw|hit|stop", "delay": 0.01},
+# và một dòng {"table": 0, "seed": ...} cho seed hộp bài của bàn. Với cùng --seed, mỗi bàn có seed hộp bài và
+# luồng bấm riêng suy ra từ seed đó, nên hai lần chạy chia cùng bài và bấm cùng số lượt (với --think > 0,
+# thứ tự bấm giữa các ghế của một bàn theo thời gian thật nên lá mỗi ghế nhận có thể khác).
+
+ids = itertools.count(1 << 40)
+BUTTONS = ("join", "start", "draw", "hit", "stop")
+
+
+class Transport:
+    # Đếm lời gọi API mà bot thực sự gửi đi và giả lập độ trễ của mỗi lời gọi
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+
+    async def call(self, name):
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.name = f"user{user_id}"
+        self.mention = f"<@{user_id}>"
+
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+
+
+class FakeMessage:
+    def __init__(self, transport, channel, content=None, view=None, message_id=None):
+        self.transport = transport
+        self.id = message_id or next(ids)
+        self.channel = channel
+        self.content = content
+        self.view = view
+
+    async def edit(self, content=None, view=...):
+        await self.transport.call("message.edit")
+        if content is not None:
+            self.content = content
+        if view is not ...:
+            self.view = view
+
+    async def delete(self, delay=None):
+        # Như WebhookMessage.delete(delay=...): chạy nền, không chặn người gọi (chỉ đếm, không chờ)
+        if delay is not None:
+            self.transport.calls["message.delete"] += 1
+            return
+        await self.transport.call("message.delete")
+
+
+class FakeChannel:
+    def __init__(self, transport, channel_id, guild):
+        self.transport = transport
+        self.id = channel_id
+        self.guild = guild
+        self.messages = []
+
+    async def send(self, content=None, view=None):
+        await self.transport.call("channel.send")
+        message = FakeMessage(self.transport, self, content, view)
+        self.messages.append(message)
+        return message
+
+    def get_partial_message(self, message_id):
+        return FakeMessage(self.transport, self, message_id=message_id)
+
+
+class FakeContext:
+    # Thay cho commands.Context của lệnh !xidach
+    def __init__(self, channel, user):
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = user
+
+    async def send(self, content=None, view=None):
+        return await self.channel.send(content, view=view)
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+    async def send_message(self, content=None, view=None, ephemeral=False, **kwargs):
+        await self.interaction.transport.call("response.send_message")
+        self.done = True
+        self.interaction.reply = content
+
+    async def edit_message(self, content=None, view=None, **kwargs):
+        await self.interaction.transport.call("response.edit_message")
+        self.done = True
+        self.interaction.reply = content
+
+    async def defer(self, **kwargs):
+        await self.interaction.transport.call("response.defer")
+        self.done = True
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, content=None, view=None, ephemeral=False, **kwargs):
+        await self.interaction.transport.call("followup.send")
+        return FakeMessage(self.interaction.transport, self.interaction.channel, content, view)
+
+
+class FakeInteraction:
+    def __init__(self, transport, channel, user):
+        self.transport = transport
+        self.channel = channel
+        self.channel_id = channel.id
+        self.guild = channel.guild
+        self.guild_id = channel.guild.id
+        self.user = user
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.reply = None  # Nội dung bot trả lời riêng cho người bấm
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+
+def hand_score(text):
+    # Đọc "Tổng điểm: N" trong tin nhắn bài như người chơi nhìn thấy
+    found = re.search(r"Tổng điểm: (\d+)", text or "")
+    return int(found.group(1)) if found else None
+
+
+class Replay:
+    def __init__(self, transport, think=0.0, record=None):
+        self.transport = transport
+        self.think = think
+        self.record = record  # list nhận các lượt bấm đã chạy (để ghi ra file)
+        self.latencies = defaultdict(list)
+        self.users = {}
+        self.channels = {}
+        self.dealt = 0
+        self.all_dealt = asyncio.Event()
+        self.tables = 0
+
+    def channel(self, table):
+        if table not in self.channels:
+            guild = FakeGuild(next(ids))
+            self.channels[table] = FakeChannel(self.transport, next(ids), guild)
+        return self.channels[table]
+
+    def user(self, table, user):
+        key = table, user
+        if key not in self.users:
+            self.users[key] = FakeUser(next(ids))
+        return self.users[key]
+
+    def game_id(self, channel, prefix):
+        # Lấy ID bàn từ custom_id của nút (phòng chờ hoặc "Bốc bài") trên tin nhắn công khai gần nhất của bàn
+        for message in reversed(channel.messages):
+            for item in getattr(message.view, "children", ()):
+                if item.custom_id.startswith(prefix):
+                    return item.custom_id.rsplit("_", 1)[1]
+        return None
+
+    async def click(self, table, user, button, delay=0.0):
+        if delay:
+            await asyncio.sleep(delay)
+        channel = self.channel(table)
+        player = self.user(table, user)
+        if button in ("join", "start"):
+            game_id = self.game_id(channel, "xidach_join_")
+            item = JoinButton(game_id) if button == "join" else StartButton(game_id)
+        else:
+            game_id = self.game_id(channel, "draw_")
+            if game_id is None:
+                return None  # Ván đã kết thúc (nhà cái có Xì dách/Xì Bàng) hoặc chưa chia bài
+            if button == "draw":
+                item = DrawButton(player.id, game_id)
+            else:
+                item = CardButton("Bốc tiếp" if button == "hit" else "Ngừng", player.id, game_id)
+        if self.record is not None:
+            self.record.append({"table": table, "user": user, "button": button, "delay": delay})
+        interaction = FakeInteraction(self.transport, channel, player)
+        started = time.perf_counter()
+        await item.callback(interaction)
+        self.latencies[button].append(time.perf_counter() - started)
+        return interaction.reply
+
+    async def open_table(self, table, seed=None):
+        channel = self.channel(table)
+        if seed is not None and self.record is not None:
+            self.record.append({"table": table, "seed": seed})
+        await main.start_game(FakeContext(channel, self.user(table, 0)), seed=seed)
+
+    def mark_dealt(self):
+        # Điểm hẹn: đo bộ nhớ khi mọi bàn đều đã chia bài và đang chơi
+        self.dealt += 1
+        if self.dealt == self.tables:
+            self.all_dealt.set()
+
+    def delay(self, rng):
+        return rng.uniform(0, self.think) if self.think else 0.0
+
+    async def random_table(self, table, players, rng, seed=None):
+        # Mỗi người chơi rút thêm tới một ngưỡng ngẫu nhiên rồi ngừng; các người chơi bấm xen kẽ nhau
+        await self.open_table(table, seed)
+        seats = range(1, players + 1)
+        await asyncio.gather(*(self.click(table, seat, "join", self.delay(rng)) for seat in seats))
+        await asyncio.gather(*(self.click(table, seat, "start", self.delay(rng)) for seat in seats))
+        self.mark_dealt()
+        await self.all_dealt.wait()
+
+        async def play(seat):
+            stand = rng.randint(14, 18)
+            reply = await self.click(table, seat, "draw", self.delay(rng))
+            while "thắng ngay" not in (reply or ""):
+                score = hand_score(reply)
+                if score is None:
+                    return  # Bot trả lời lỗi (vd. ván đã kết thúc)
+                if score >= stand:
+                    await self.click(table, seat, "stop", self.delay(rng))
+                    return
+                reply = await self.click(table, seat, "hit", self.delay(rng))
+
+        await asyncio.gather(*(play(seat) for seat in seats))
+
+    async def scripted_table(self, table, events, seed=None):
+        await self.open_table(table, seed)
+        dealt = False
+        for event in events:
+            if event["button"] in ("draw", "hit", "stop") and not dealt:
+                dealt = True
+                self.mark_dealt()
+                await self.all_dealt.wait()
+            await self.click(table, event["user"], event["button"], event.get("delay", 0.0))
+        if not dealt:
+            self.mark_dealt()
+
+
+def traced_memory():
+    # Bộ nhớ đang cấp phát, bỏ qua các đối tượng giả của chính harness này
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, tracemalloc.__file__),
+    ])
+    return sum(stat.size for stat in snapshot.statistics("filename"))
+
+
+async def drain():
+    # Chờ các lần sửa phòng chờ còn treo trong debouncer rồi dừng các worker của bàn
+    while main.lobby_editor.tasks:
+        await asyncio.gather(*main.lobby_editor.tasks.values(), return_exceptions=True)
+    workers = list(main.actors.workers.values())
+    for worker in workers:
+        worker.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+    # Như khi worker tự thoát sau idle_timeout
+    main.actors.queues.clear()
+    main.actors.workers.clear()
+
+
+async def run(args):
+    transport = Transport(args.latency / 1000)
+    record = [] if args.record else None
+    replay = Replay(transport, args.think / 1000, record)
+    rng = random.Random(args.seed)
+    flusher = asyncio.create_task(main.state_store.run())
+
+    if args.memory:
+        # tracemalloc làm chậm mọi lần cấp phát: khi bật, độ trễ in ra chỉ nên dùng để so sánh tương đối
+        tracemalloc.start()
+        baseline = traced_memory()
+    if args.script:
+        by_table = defaultdict(list)
+        seeds = {}
+        with open(args.script, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    event = json.loads(line)
+                    if "seed" in event:
+                        seeds[event["table"]] = event["seed"]
+                    else:
+                        by_table[event["table"]].append(event)
+        replay.tables = len(by_table)
+        coros = [replay.scripted_table(table, events, seeds.get(table)) for table, events in by_table.items()]
+    else:
+        player_counts = [int(p) for p in re.split(r"[-,]", args.players)]
+        low, high = min(player_counts), max(player_counts)
+        replay.tables = args.tables
+        coros = []
+        for table in range(args.tables):
+            # Mỗi bàn một RNG riêng cho luồng bấm, để thứ tự các bàn chạy xen kẽ không làm đổi lựa chọn của bàn
+            players, table_rng, seed = rng.randint(low, high), random.Random(rng.getrandbits(64)), rng.getrandbits(63)
+            coros.append(replay.random_table(table, players, table_rng, seed))
+
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(coro) for coro in coros]
+    await replay.all_dealt.wait()
+    if args.memory:
+        in_play = traced_memory() - baseline
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    del tasks, coros
+    await drain()
+    await main.state_store.flush()
+    flusher.cancel()
+    await asyncio.sleep(0.1)  # Để các task vừa huỷ chạy xong và nhả tham chiếu
+    replay.channels.clear()  # Tin nhắn giả giữ view/nội dung do bot tạo; bỏ đi để chỉ còn phần bot tự giữ lại
+    if args.memory:
+        left = traced_memory() - baseline
+        tracemalloc.stop()
+
+    if record is not None:
+        with open(args.record, "w", encoding="utf-8") as f:
+            for event in record:
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    tables = replay.tables
+    clicks = sum(len(values) for values in replay.latencies.values())
+    print(f"{tables} bàn, {clicks} lượt bấm trong {elapsed:.2f} giây ({clicks / elapsed:,.0f} lượt/giây)")
+    print(f"{'nút':<6} {'lượt':>8} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for button in BUTTONS:
+        values = replay.latencies.get(button)
+        if values:
+            print(f"{button:<6} {len(values):>8} {percentile(values, 0.5) * 1000:>9.3f} {percentile(values, 0.99) * 1000:>9.3f}")
+    print("Lời gọi API mỗi ván:")
+    for name, count in sorted(transport.calls.items()):
+        print(f"  {name:<24} {count / tables:>7.2f}")
+    print(f"  {'tổng':<24} {sum(transport.calls.values()) / tables:>7.2f}")
+    if args.memory:
+        print(f"Bộ nhớ mỗi bàn đang chơi: {in_play / tables / 1024:.1f} KiB; còn lại sau khi kết thúc: {left / tables / 1024:.1f} KiB")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Phát lại luồng bấm nút với Discord giả để đo hiệu năng")
+    parser.add_argument("--tables", type=int, default=1000, help="số bàn chơi cùng lúc")
+    parser.add_argument("--players", default="1-5", help="số người mỗi bàn, ví dụ 1-5 hoặc 3")
+    parser.add_argument("--think", type=float, default=0.0, help="thời gian suy nghĩ tối đa giữa các lượt bấm (ms)")
+    parser.add_argument("--latency", type=float, default=0.0, help="độ trễ giả lập cho mỗi lời gọi API (ms)")
+    parser.add_argument("--memory", action="store_true", help="đo bộ nhớ mỗi bàn bằng tracemalloc")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--record", help="ghi luồng bấm đã chạy ra file JSON lines")
+    parser.add_argument("--script", help="phát lại luồng bấm từ file JSON lines thay vì sinh ngẫu nhiên")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main_cli()
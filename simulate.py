@@ -0,0 +1,186 @@
+import argparse
+import random
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from cards import (
+    BUST, CARD_IS_ACE, CARD_POINTS, DEALER_MIN, DEALER_STAND, DECK, MAX_HAND_CARDS, PLAYER_MIN, SCORE_TABLE,
+    Hand, check_special_hands, dealer_draws, pick_winner,
+)
+
+# Mô phỏng Monte Carlo luật xì dách của bot, chạy hàng loạt ván cùng lúc bằng mảng NumPy.
+# Dùng chung bảng điểm và các hằng số luật trong cards.py với bot, nên đổi luật ở đó là mô phỏng đổi theo.
+#
+#   python simulate.py --rounds 1000000 --players 1-5 --dealer 13-18
+#   python simulate.py --verify  # đối chiếu từng ván với luật tính từng tay (cards.Hand, pick_winner)
+#
+# Mỗi ván dùng một hộp bài xào mới. Mỗi ghế (nhà cái là ghế 0) lấy 5 lá liên tiếp trong hộp bài và chỉ dùng
+# số lá cần thiết: vì quyết định của mỗi tay chỉ phụ thuộc bài của chính nó, cách chia này có cùng phân phối
+# với thứ tự bốc thật trên bàn. Người chơi rút thêm khi dưới --player-stand (mặc định PLAYER_MIN).
+# Nhà cái có Xì dách / Xì Bàng ngay lúc chia thì thắng luôn, người chơi không được chơi.
+
+def parse_range(text):
+    # "1-5" -> [1, 2, 3, 4, 5]; "2,4" -> [2, 4]
+    values = []
+    for part in text.split(","):
+        start, _, end = part.partition("-")
+        values.extend(range(int(start), int(end or start) + 1))
+    return values
+
+
+def deal(rng, rounds, seats, decks=1):
+    # Mỗi hàng là một hộp bài đã xào; lấy 5 lá đầu cho mỗi ghế -> mảng (rounds, seats, 5)
+    shoe = np.tile(np.array(DECK * decks, dtype=np.int8), (rounds, 1))
+    shoe = rng.permuted(shoe, axis=1)
+    return shoe[:, :seats * MAX_HAND_CARDS].reshape(rounds, seats, MAX_HAND_CARDS)
+
+
+def play(cards, stand):
+    # Điểm của tay sau 1..5 lá tra từ SCORE_TABLE, dừng ở lá đầu tiên (từ lá thứ 2) đạt `stand` hoặc đủ 5 lá.
+    # Trả về (điểm cuối, số lá đã dùng)
+    hard = np.cumsum(POINTS[cards], axis=-1)
+    aces = np.cumsum(ACES[cards], axis=-1)
+    scores = TABLE[aces, hard]
+    stop = scores[..., 1:] >= stand
+    stop[..., -1] = True
+    length = np.argmax(stop, axis=-1) + 2
+    final = np.take_along_axis(scores, (length - 1)[..., None], axis=-1)[..., 0]
+    return final, length
+
+
+def simulate(rng, rounds, players, dealer_stand, player_stand, decks=1):
+    cards = deal(rng, rounds, players + 1, decks)
+    dealer_cards = cards[:, 0]
+    # Xì dách / Xì Bàng của nhà cái, cùng điều kiện với check_special_hands
+    opening_aces = ACES[dealer_cards[:, :2]].sum(axis=1)
+    opening_hard = POINTS[dealer_cards[:, :2]].sum(axis=1)
+    special = (opening_aces == 2) | ((opening_aces == 1) & (opening_hard == 10))
+    player_scores, _ = play(cards[:, 1:], player_stand)
+    dealer_score, dealer_length = play(dealer_cards, dealer_stand)
+
+    # Cùng luật với pick_winner: người chơi trước, nhà cái sau; argmax lấy người đầu tiên khi bằng điểm
+    scores = np.concatenate([player_scores, dealer_score[:, None]], axis=1)
+    minimum = np.array([PLAYER_MIN] * players + [DEALER_MIN])
+    eligible = np.where((scores >= minimum) & (scores <= BUST), scores, -1)
+    winner = np.argmax(eligible, axis=1)
+    winner = np.where(eligible.max(axis=1) < 0, -1, winner)
+    winner = np.where(special, players, winner)
+    return {
+        "cards": cards,
+        "special": special,
+        "player_scores": player_scores,
+        "dealer_score": dealer_score,
+        "dealer_length": dealer_length,
+        "winner": winner,
+    }
+
+
+def summarize(result, players):
+    winner = result["winner"]
+    special = result["special"]
+    played = ~special
+    rounds = len(winner)
+    return {
+        "house": np.count_nonzero(winner == players) / rounds,
+        "player": np.count_nonzero((winner >= 0) & (winner < players)) / rounds,
+        "push": np.count_nonzero(winner < 0) / rounds,
+        "dealer_bust": np.count_nonzero(played & (result["dealer_score"] > BUST)) / rounds,
+        "player_bust": np.count_nonzero(result["player_scores"][played] > BUST) / max(np.count_nonzero(played) * players, 1),
+        "special": np.count_nonzero(special) / rounds,
+    }
+
+
+def replay_round(cards, players, dealer_stand, player_stand):
+    # Chơi lại một ván bằng đúng các hàm tính từng tay mà bot dùng, để đối chiếu với bản NumPy
+    dealer = Hand(cards[0][:2])
+    if check_special_hands(dealer):
+        return players
+    entries = []
+    for seat in range(1, players + 1):
+        seat_cards = iter(cards[seat])
+        hand = Hand([next(seat_cards), next(seat_cards)])
+        while hand.score < player_stand and len(hand) < MAX_HAND_CARDS:
+            hand.add(next(seat_cards))
+        entries.append((seat - 1, hand.score, PLAYER_MIN))
+    dealer_cards = iter(cards[0][2:])
+    while dealer_draws(dealer, dealer_stand):
+        dealer.add(next(dealer_cards))
+    entries.append((players, dealer.score, DEALER_MIN))
+    winner, _ = pick_winner(entries)
+    return -1 if winner is None else winner
+
+
+def verify(rng, rounds, players_list, dealer_list, player_stand, decks):
+    mismatches = 0
+    for players in players_list:
+        for dealer_stand in dealer_list:
+            result = simulate(rng, rounds, players, dealer_stand, player_stand, decks)
+            cards = result["cards"].tolist()
+            for index in range(rounds):
+                expected = replay_round(cards[index], players, dealer_stand, player_stand)
+                if expected != result["winner"][index]:
+                    mismatches += 1
+                    print(f"Lệch: {players} người, nhà cái dừng ở {dealer_stand}, bài {cards[index]}: "
+                          f"mong đợi {expected}, NumPy ra {result['winner'][index]}")
+    checked = rounds * len(players_list) * len(dealer_list)
+    print(f"Đã đối chiếu {checked} ván, {mismatches} ván lệch.")
+    return mismatches == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mô phỏng Monte Carlo luật xì dách của bot")
+    parser.add_argument("--rounds", type=int, default=200_000, help="số ván cho mỗi cấu hình")
+    parser.add_argument("--batch", type=int, default=100_000, help="số ván chạy trong một mảng")
+    parser.add_argument("--players", default="1-5", help="số người chơi, ví dụ 1-5 hoặc 2,4")
+    parser.add_argument("--dealer", default=str(DEALER_STAND), help="ngưỡng dừng của nhà cái, ví dụ 13-18")
+    parser.add_argument("--player-stand", type=int, default=PLAYER_MIN, help="người chơi rút thêm khi dưới mức này")
+    parser.add_argument("--decks", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--verify", action="store_true", help="đối chiếu với luật tính từng tay thay vì đo")
+    args = parser.parse_args()
+
+    if np is None:
+        sys.exit("simulate.py cần NumPy: pip install numpy")
+
+    rng = np.random.default_rng(args.seed if args.seed is not None else random.SystemRandom().randrange(2 ** 63))
+    players_list = [p for p in parse_range(args.players) if 1 <= p <= 5]
+    dealer_list = parse_range(args.dealer)
+
+    if args.verify:
+        sys.exit(0 if verify(rng, min(args.rounds, 2000), players_list, dealer_list, args.player_stand, args.decks) else 1)
+
+    print(f"{'người':>5} {'nhà cái':>7} {'cái thắng':>9} {'con thắng':>9} {'hoà':>7} {'cái quắc':>8} "
+          f"{'con quắc':>8} {'xì lúc chia':>11} {'ván/giây':>12}")
+    for players in players_list:
+        for dealer_stand in dealer_list:
+            totals = dict.fromkeys(("house", "player", "push", "dealer_bust", "player_bust", "special"), 0.0)
+            elapsed = 0.0
+            done = 0
+            while done < args.rounds:
+                size = min(args.batch, args.rounds - done)
+                started = time.perf_counter()
+                summary = summarize(simulate(rng, size, players, dealer_stand, args.player_stand, args.decks), players)
+                elapsed += time.perf_counter() - started
+                for name, rate in summary.items():
+                    totals[name] += rate * size
+                done += size
+            rates = {name: value / done for name, value in totals.items()}
+            print(f"{players:>5} {dealer_stand:>7} {rates['house']:>9.2%} {rates['player']:>9.2%} "
+                  f"{rates['push']:>7.2%} {rates['dealer_bust']:>8.2%} {rates['player_bust']:>8.2%} "
+                  f"{rates['special']:>11.2%} {done / elapsed:>12,.0f}")
+
+
+if np is not None:
+    # Các bảng tra cứu của cards.py dưới dạng mảng để lập chỉ mục cả lô cùng lúc
+    POINTS = np.array(CARD_POINTS, dtype=np.int16)
+    ACES = np.array(CARD_IS_ACE, dtype=np.int16)
+    TABLE = np.array(SCORE_TABLE, dtype=np.int16)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import asyncio
+import sqlite3
+import time
+
+from cards import QUAC
+
+# Lưu kết quả từng ván (chỉ thêm, không sửa) và bảng tổng hợp theo người chơi trong SQLite.
+# Bot chỉ đẩy kết quả vào hàng chờ trong RAM; một task nền ghi theo lô, nên callback không bao giờ chờ ổ đĩa.
+# Bảng xếp hạng đọc từ cache top-N của từng guild, cập nhật dần theo từng kết quả mới.
+#
+# Xếp hạng theo số ván thắng, bằng nhau thì ai đạt số đó trước đứng trên (cột reached). Khoá xếp hạng của một
+# người chỉ tốt lên khi người đó thắng, nên cache top-N giữ đúng mà không cần quét lại.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    game_id TEXT NOT NULL,
+    guild_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    won INTEGER NOT NULL,
+    finished REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_user ON results (user_id);
+CREATE INDEX IF NOT EXISTS results_guild ON results (guild_id, finished);
+CREATE TABLE IF NOT EXISTS user_stats (
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    games INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    busts INTEGER NOT NULL,
+    best INTEGER NOT NULL,
+    reached REAL NOT NULL,
+    PRIMARY KEY (guild_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS user_stats_rank ON user_stats (guild_id, wins DESC, reached);
+CREATE INDEX IF NOT EXISTS user_stats_user ON user_stats (user_id);
+"""
+
+# Một dòng kết quả: (game_id, guild_id, channel_id, user_id, score, kind, won, busted, finished)
+
+
+def result_rows(game_id, guild_id, channel_id, outcomes, winner):
+    # outcomes: {user_id: (loại tay, điểm)} đã chốt lúc công bố kết quả; ván trong tin nhắn riêng tính vào guild 0
+    finished = time.time()
+    return [
+        (game_id, guild_id or 0, channel_id, user_id, score, kind, int(user_id == winner), int(kind == QUAC), finished)
+        for user_id, (kind, score) in outcomes.items()
+    ]
+
+
+def rank(entry):
+    # entry: [user_id, games, wins, reached]
+    return -entry[2], entry[3]
+
+
+class StatsStore:
+    def __init__(self, path):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.db.commit()
+
+    def write(self, rows):
+        # Cả lô trong một transaction: thêm kết quả và cộng dồn vào user_stats
+        with self.db:
+            self.db.executemany(
+                "INSERT INTO results (game_id, guild_id, channel_id, user_id, score, kind, won, finished) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(game_id, guild_id, channel_id, user_id, score, kind, won, finished)
+                 for game_id, guild_id, channel_id, user_id, score, kind, won, busted, finished in rows],
+            )
+            self.db.executemany(
+                "INSERT INTO user_stats (guild_id, user_id, games, wins, busts, best, reached) "
+                "VALUES (?, ?, 1, ?, ?, ?, ?) "
+                "ON CONFLICT(guild_id, user_id) DO UPDATE SET games = games + 1, wins = wins + excluded.wins, "
+                "busts = busts + excluded.busts, best = MAX(best, excluded.best), "
+                "reached = CASE WHEN excluded.wins THEN excluded.reached ELSE reached END",
+                [(guild_id, user_id, won, busted, score if not busted else 0, finished)
+                 for game_id, guild_id, channel_id, user_id, score, kind, won, busted, finished in rows],
+            )
+
+    def top(self, guild_id, limit):
+        # Đi theo chỉ mục user_stats_rank, chỉ đọc `limit` dòng
+        return self.db.execute(
+            "SELECT user_id, games, wins, reached FROM user_stats WHERE guild_id = ? "
+            "ORDER BY wins DESC, reached LIMIT ?",
+            (guild_id, limit),
+        ).fetchall()
+
+    def totals(self, guild_id, user_id):
+        return self.db.execute(
+            "SELECT games, wins, reached FROM user_stats WHERE guild_id = ? AND user_id = ?", (guild_id, user_id)
+        ).fetchone()
+
+    def user(self, guild_id, user_id, recent):
+        totals = self.db.execute(
+            "SELECT games, wins, busts, best FROM user_stats WHERE guild_id = ? AND user_id = ?", (guild_id, user_id)
+        ).fetchone()
+        last = self.db.execute(
+            "SELECT score, kind, won FROM results WHERE user_id = ? AND guild_id = ? ORDER BY id DESC LIMIT ?",
+            (user_id, guild_id, recent),
+        ).fetchall()
+        return totals, last
+
+    def close(self):
+        self.db.close()
+
+
+class StatsRecorder:
+    # record() chỉ thêm vào hàng chờ và cập nhật cache; run() ghi hàng chờ theo lô ở nền
+    def __init__(self, store, top_size=10, interval=2.0):
+        self.store = store
+        self.top_size = top_size
+        self.interval = interval
+        self.pending = []
+        self.tops = {}  # guild_id -> [[user_id, games, wins, reached], ...] đã sắp xếp, tối đa top_size
+        self.candidates = {}  # guild_id -> người ngoài top vừa thắng, cần tra tổng số để xem có vào top không
+        # Mọi lần chạm vào SQLite đi qua khoá này: dòng còn trong hàng chờ khi khoá đang giữ chắc chắn chưa ở trong kho
+        self.lock = asyncio.Lock()
+
+    def record(self, rows):
+        self.pending.extend(rows)
+        for row in rows:
+            if row[1] in self.tops:
+                self._apply(row)
+
+    def _apply(self, row):
+        game_id, guild_id, channel_id, user_id, score, kind, won, busted, finished = row
+        top = self.tops[guild_id]
+        for entry in top:
+            if entry[0] == user_id:
+                entry[1] += 1
+                if won:
+                    entry[2] += 1
+                    entry[3] = finished
+                    top.sort(key=rank)
+                return
+        # Người ngoài top chỉ có thể vào top khi vừa thắng; tổng số của họ được tra lúc có người xem bảng xếp hạng
+        if won:
+            self.candidates.setdefault(guild_id, set()).add(user_id)
+
+    def _queued(self, guild_id, user_id):
+        return [row for row in self.pending if row[1] == guild_id and row[3] == user_id]
+
+    async def flush(self):
+        async with self.lock:
+            await self._flush()
+
+    async def _flush(self):
+        if not self.pending:
+            return
+        rows, self.pending = self.pending, []
+        try:
+            await asyncio.to_thread(self.store.write, rows)
+        except Exception:
+            self.pending[:0] = rows  # Giữ lại để lượt sau ghi lại
+            raise
+
+    def flush_sync(self):
+        # Dùng khi tắt bot: ghi nốt những gì còn lại
+        if self.pending:
+            rows, self.pending = self.pending, []
+            self.store.write(rows)
+
+    async def leaderboard(self, guild_id):
+        if guild_id in self.tops and not self.candidates.get(guild_id):
+            return [tuple(entry) for entry in self.tops[guild_id]]
+        async with self.lock:
+            if guild_id not in self.tops:
+                # Lần đầu: đọc top từ kho theo chỉ mục; kết quả đến trong lúc đọc còn nằm trong hàng chờ
+                # (chưa ghi vì đang giữ khoá) nên áp lại vào cache
+                await self._flush()
+                rows = await asyncio.to_thread(self.store.top, guild_id, self.top_size)
+                self.tops[guild_id] = [list(row) for row in rows]
+                for row in self.pending:
+                    if row[1] == guild_id:
+                        self._apply(row)
+            top = self.tops[guild_id]
+            for user_id in self.candidates.pop(guild_id, ()):
+                # Tổng số trong kho cộng với hàng chờ: đúng vì không có lượt ghi nào chạy khi đang giữ khoá
+                totals = await asyncio.to_thread(self.store.totals, guild_id, user_id)
+                games, wins, reached = totals or (0, 0, 0.0)
+                for row in self._queued(guild_id, user_id):
+                    games += 1
+                    if row[6]:
+                        wins += 1
+                        reached = row[8]
+                top[:] = [entry for entry in top if entry[0] != user_id]
+                top.append([user_id, games, wins, reached])
+            top.sort(key=rank)
+            del top[self.top_size:]
+        return [tuple(entry) for entry in top]
+
+    async def user(self, guild_id, user_id, recent=5):
+        # Số liệu trong kho cộng với các kết quả còn trong hàng chờ
+        async with self.lock:
+            totals, last = await asyncio.to_thread(self.store.user, guild_id, user_id, recent)
+            games, wins, busts, best = totals or (0, 0, 0, 0)
+            queued = self._queued(guild_id, user_id)
+        for _, _, _, _, score, kind, won, busted, _ in queued:
+            games += 1
+            wins += won
+            busts += busted
+            if not busted:
+                best = max(best, score)
+        last = ([(score, kind, won) for _, _, _, _, score, kind, won, _, _ in reversed(queued)] + list(last))[:recent]
+        return games, wins, busts, best, last
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Lỗi khi ghi kết quả ván chơi: {e}")
+
+
+def open_stats(url, top_size=10):
+    # "sqlite:đường/dẫn.db" -> lưu ra đĩa, bỏ trống -> SQLite trong RAM (mất khi tắt bot)
+    path = url[len("sqlite:"):] if url and url.startswith("sqlite:") else ":memory:"
+    return StatsRecorder(StatsStore(path), top_size)
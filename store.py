@@ -0,0 +1,110 @@
+import asyncio
+import json
+import sqlite3
+import time
+
+
+class MemoryStore:
+    # Mặc định: giữ bản sao trạng thái trong RAM, không ghi ra đĩa
+    blocking = False
+
+    def __init__(self):
+        self.rows = {}
+
+    def load(self):
+        return dict(self.rows)
+
+    def write(self, rows):
+        for key, state in rows.items():
+            if state is None:
+                self.rows.pop(key, None)
+            else:
+                self.rows[key] = state
+
+    def close(self):
+        pass
+
+
+class SqliteStore:
+    # Lưu trạng thái bàn vào SQLite (WAL), mỗi lượt ghi là một transaction nên không bị ghi dở khi crash
+    blocking = True
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS tables (key TEXT PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        self.db.commit()
+
+    def load(self):
+        return {key: json.loads(state) for key, state in self.db.execute("SELECT key, state FROM tables")}
+
+    def write(self, rows):
+        now = time.time()
+        upserts = [(str(key), json.dumps(state), now) for key, state in rows.items() if state is not None]
+        deletes = [(str(key),) for key, state in rows.items() if state is None]
+        with self.db:
+            if upserts:
+                self.db.executemany(
+                    "INSERT INTO tables (key, state, updated) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET state = excluded.state, updated = excluded.updated",
+                    upserts,
+                )
+            if deletes:
+                self.db.executemany("DELETE FROM tables WHERE key = ?", deletes)
+
+    def close(self):
+        self.db.close()
+
+
+class WriteBehind:
+    # Nút bấm chỉ đánh dấu bàn đã thay đổi; một task nền gom lại và ghi theo lô, không chặn tương tác
+    def __init__(self, backend, dump, interval=0.5):
+        self.backend = backend
+        self.dump = dump  # dump(key) -> dict có thể JSON hoá, hoặc None nếu bàn đã bị xoá
+        self.interval = interval
+        self.dirty = set()
+
+    def mark(self, key):
+        self.dirty.add(key)
+
+    def _collect(self):
+        keys, self.dirty = self.dirty, set()
+        return {key: self.dump(key) for key in keys}
+
+    async def flush(self):
+        if not self.dirty:
+            return
+        rows = self._collect()
+        try:
+            if self.backend.blocking:
+                await asyncio.to_thread(self.backend.write, rows)
+            else:
+                self.backend.write(rows)
+        except Exception:
+            # Ghi lỗi thì giữ lại để lượt sau ghi lại (trạng thái mới nhất sẽ được dump lại)
+            self.dirty.update(rows)
+            raise
+
+    def flush_sync(self):
+        # Dùng khi tắt bot: ghi nốt những gì còn lại
+        if self.dirty:
+            self.backend.write(self._collect())
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Lỗi khi lưu trạng thái bàn chơi: {e}")
+
+
+def open_store(url):
+    # "sqlite:đường/dẫn.db" -> SqliteStore, bỏ trống -> MemoryStore
+    if url and url.startswith("sqlite:"):
+        return SqliteStore(url[len("sqlite:"):])
+    return MemoryStore()
@@ -0,0 +1,209 @@
+from cards import DEALER_MIN, MAX_HAND_CARDS, PLAYER_MIN, Hand, Shoe, check_special_hands, dealer_draws
+
+# Giai đoạn của một bàn. Chỉ được chuyển theo TRANSITIONS:
+# phòng chờ -> chia bài -> đang chơi -> đã chốt (hoặc chia bài -> đã chốt khi nhà cái có Xì dách / Xì Bàng)
+LOBBY = "lobby"
+DEALING = "dealing"
+PLAYING = "playing"
+RESOLVED = "resolved"
+TRANSITIONS = {
+    LOBBY: (DEALING,),
+    DEALING: (PLAYING, RESOLVED),
+    PLAYING: (RESOLVED,),
+    RESOLVED: (),
+}
+MAX_PLAYERS = 5
+
+
+class TableStateError(Exception):
+    # Thao tác không hợp lệ với giai đoạn hiện tại của bàn (lỗi lập trình, không phải lỗi của người chơi)
+    pass
+
+
+class Player:
+    __slots__ = ("user_id", "hand", "voted", "stopped")
+
+    def __init__(self, user_id, hand=None, voted=False, stopped=False):
+        self.user_id = user_id
+        self.hand = hand  # None cho tới khi bấm "Bốc bài"
+        self.voted = voted  # Đã bấm "Bắt đầu"
+        self.stopped = stopped  # Đã chọn "Ngừng" (hoặc thắng ngay)
+
+
+class Table:
+    # Một bàn chơi. Bàn ở phòng chờ chỉ giữ vài trường nhỏ: chưa có hộp bài, tin nhắn chỉ lưu dạng partial,
+    # nên có thể giữ hàng chục nghìn bàn đang chờ
+    __slots__ = ("game_id", "channel_id", "guild_id", "message", "phase", "players", "dealer", "shoe", "seed",
+                 "prompt_messages")
+
+    def __init__(self, game_id, channel_id, guild_id=None, message=None, seed=None):
+        self.game_id = game_id
+        self.channel_id = channel_id
+        self.guild_id = guild_id  # Dùng để biết tiến trình nào giữ bàn khi chạy nhiều shard
+        self.message = message  # Tin nhắn phòng chờ
+        self.phase = LOBBY
+        self.players = {}  # user_id -> Player, theo thứ tự tham gia
+        self.dealer = None
+        self.shoe = None  # Chỉ tạo khi chia bài; seed lưu trong shoe.seed để phát lại
+        self.seed = seed  # Seed cố định cho hộp bài (replay.py dùng để chia lại đúng bài), None là ngẫu nhiên
+        self.prompt_messages = []  # ID tin nhắn "Bốc bài" công khai của bàn
+
+    def advance(self, phase):
+        if phase not in TRANSITIONS[self.phase]:
+            raise TableStateError(f"Bàn {self.game_id} không thể chuyển từ {self.phase} sang {phase}")
+        self.phase = phase
+
+    def expect(self, phase):
+        if self.phase != phase:
+            raise TableStateError(f"Bàn {self.game_id} đang ở giai đoạn {self.phase}, cần {phase}")
+
+    @property
+    def full(self):
+        return len(self.players) >= MAX_PLAYERS
+
+    @property
+    def votes(self):
+        return sum(1 for player in self.players.values() if player.voted)
+
+    def join(self, user_id):
+        self.expect(LOBBY)
+        if self.full:
+            raise TableStateError(f"Bàn {self.game_id} đã đủ {MAX_PLAYERS} người")
+        self.players[user_id] = Player(user_id)
+
+    def leave(self, user_id):
+        # Chỉ rời được khi còn ở phòng chờ
+        self.expect(LOBBY)
+        del self.players[user_id]
+
+    def vote(self, user_id):
+        # Trả về True khi mọi người chơi đã bấm "Bắt đầu"
+        self.expect(LOBBY)
+        self.players[user_id].voted = True
+        return self.votes == len(self.players)
+
+    def deal(self, decks=1):
+        # Chia 2 lá cho nhà cái; nhà cái có Xì dách / Xì Bàng thì bàn chốt luôn
+        self.advance(DEALING)
+        self.shoe = Shoe(decks, self.seed)
+        self.dealer = Hand(self.shoe.draw() for _ in range(2))
+        self.advance(RESOLVED if check_special_hands(self.dealer) else PLAYING)
+
+    def open_hand(self, player):
+        # 2 lá đầu khi người chơi bấm "Bốc bài"
+        self.expect(PLAYING)
+        if player.stopped or player.hand is not None:
+            raise TableStateError(f"Người chơi {player.user_id} đã bốc bài hoặc đã dừng")
+        player.hand = Hand(self.shoe.draw() for _ in range(2))
+        return player.hand
+
+    def hit(self, player):
+        self.expect(PLAYING)
+        if player.stopped or player.hand is None or len(player.hand) >= MAX_HAND_CARDS:
+            raise TableStateError(f"Người chơi {player.user_id} không thể bốc thêm")
+        player.hand.add(self.shoe.draw())
+        return player.hand
+
+    def stop(self, player):
+        # Trả về True khi mọi người chơi đã ngừng
+        self.expect(PLAYING)
+        player.stopped = True
+        return all(other.stopped for other in self.players.values())
+
+    def resolve(self):
+        # Nhà cái rút thêm theo luật (dealer_draws) rồi chốt kết quả từng tay đúng một lần
+        self.advance(RESOLVED)
+        while dealer_draws(self.dealer):
+            self.dealer.add(self.shoe.draw())
+        self.dealer.classify(DEALER_MIN)
+        for player in self.players.values():
+            if player.hand is None:
+                player.hand = Hand()
+            player.hand.classify(PLAYER_MIN)
+
+    def state(self):
+        # Dạng JSON để lưu; tin nhắn chỉ lưu ID
+        return {
+            "game_id": self.game_id,
+            "channel_id": self.channel_id,
+            "guild_id": self.guild_id,
+            "message_id": self.message.id,
+            "phase": self.phase,
+            "players": [
+                [player.user_id, player.hand.cards if player.hand is not None else None, player.voted, player.stopped]
+                for player in self.players.values()
+            ],
+            "dealer": self.dealer.cards if self.dealer is not None else None,
+            "shoe": self.shoe.state() if self.shoe is not None else None,
+            "seed": self.seed,
+            "prompt_messages": self.prompt_messages,
+        }
+
+    @classmethod
+    def from_state(cls, state, message):
+        table = cls(state["game_id"], state["channel_id"], state["guild_id"], message, state["seed"])
+        table.phase = state["phase"]
+        for user_id, cards, voted, stopped in state["players"]:
+            table.players[user_id] = Player(user_id, Hand(cards) if cards is not None else None, voted, stopped)
+        table.dealer = Hand(state["dealer"]) if state["dealer"] is not None else None
+        table.shoe = Shoe.from_state(state["shoe"]) if state["shoe"] is not None else None
+        table.prompt_messages = state["prompt_messages"]
+        return table
+
+
+class TableIndex:
+    # Chỉ mục các bàn đang mở, tra cứu O(1) theo ID bàn (game_id, có sẵn trong custom_id của mọi nút),
+    # theo kênh (một kênh có thể có nhiều bàn) và theo người chơi (mỗi người chỉ ở một bàn tại một thời điểm)
+    def __init__(self):
+        self.by_id = {}
+        self.by_channel = {}  # channel_id -> {game_id: None}, dict để giữ thứ tự mở bàn
+        self.by_user = {}  # user_id -> game_id
+        self.channel_of = {}  # game_id -> channel_id
+        self.members = {}  # game_id -> các user_id đã gắn với bàn (để gỡ khi đóng bàn)
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def __contains__(self, game_id):
+        return game_id in self.by_id
+
+    def get(self, game_id):
+        return self.by_id.get(game_id)
+
+    def values(self):
+        return self.by_id.values()
+
+    def add(self, table):
+        self.by_id[table.game_id] = table
+        self.by_channel.setdefault(table.channel_id, {})[table.game_id] = None
+        self.channel_of[table.game_id] = table.channel_id
+        self.members[table.game_id] = set()
+
+    def remove(self, game_id):
+        # Bỏ bàn khỏi mọi chỉ mục, trả về bàn (hoặc None nếu đã bị bỏ trước đó)
+        table = self.by_id.pop(game_id, None)
+        channel_id = self.channel_of.pop(game_id, None)
+        in_channel = self.by_channel.get(channel_id)
+        if in_channel is not None:
+            in_channel.pop(game_id, None)
+            if not in_channel:
+                del self.by_channel[channel_id]
+        for user_id in self.members.pop(game_id, ()):
+            if self.by_user.get(user_id) == game_id:
+                del self.by_user[user_id]
+        return table
+
+    def count_in_channel(self, channel_id):
+        return len(self.by_channel.get(channel_id, ()))
+
+    def of_user(self, user_id):
+        return self.by_user.get(user_id)
+
+    def bind(self, user_id, game_id):
+        self.by_user[user_id] = game_id
+        self.members[game_id].add(user_id)
+
+    def unbind(self, user_id, game_id):
+        if self.by_user.get(user_id) == game_id:
+            del self.by_user[user_id]
+        self.members[game_id].discard(user_id)
@@ -0,0 +1,77 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+
+class TimerHeap:
+    # Mọi hạn chờ (vd. hạn lượt của từng người chơi) nằm trong một heap và do một task nền duy nhất xử lý,
+    # thay vì mỗi hạn một task asyncio.sleep: mỗi hạn chỉ tốn một tuple trong heap và một mục trong dict.
+    # Huỷ / đặt lại hạn không sửa heap (xoá lười): mục cũ bị bỏ qua khi tới lượt, heap được dựng lại khi có quá nhiều mục cũ
+    def __init__(self):
+        self.heap = []  # (hạn, số thứ tự, key)
+        self.deadlines = {}  # key -> (hạn, số thứ tự) của lần đặt mới nhất
+        self.seq = itertools.count()
+        self.wakeup = asyncio.Event()
+        self.running = set()  # Các task on_expire đang chạy (giữ tham chiếu để không bị thu gom)
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def schedule(self, key, delay):
+        # Đặt (hoặc đặt lại) hạn của key sau `delay` giây
+        deadline = time.monotonic() + delay
+        seq = next(self.seq)
+        self.deadlines[key] = (deadline, seq)
+        heapq.heappush(self.heap, (deadline, seq, key))
+        if self.heap[0][1] == seq:
+            self.wakeup.set()  # Hạn mới sớm hơn mọi hạn đang chờ: đánh thức task để ngủ lại cho đúng
+        self._compact()
+
+    def cancel(self, key):
+        if self.deadlines.pop(key, None) is not None:
+            self._compact()
+
+    def _compact(self):
+        if len(self.heap) > 2 * len(self.deadlines) + 64:
+            self.heap = [(deadline, seq, key) for key, (deadline, seq) in self.deadlines.items()]
+            heapq.heapify(self.heap)
+
+    def _pop_due(self, now):
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            deadline, seq, key = heapq.heappop(self.heap)
+            if self.deadlines.get(key) == (deadline, seq):
+                del self.deadlines[key]
+                due.append(key)
+        return due
+
+    def _next_delay(self, now):
+        # Bỏ các mục đã huỷ / đã đặt lại ở đầu heap; None nếu không còn hạn nào
+        while self.heap:
+            deadline, seq, key = self.heap[0]
+            if self.deadlines.get(key) == (deadline, seq):
+                return deadline - now
+            heapq.heappop(self.heap)
+        return None
+
+    async def run(self, on_expire):
+        # on_expire(key) là coroutine, chạy thành task riêng để một lần xử lý chậm không làm trễ các hạn khác
+        while True:
+            self.wakeup.clear()
+            now = time.monotonic()
+            for key in self._pop_due(now):
+                task = asyncio.create_task(self._expire(on_expire, key))
+                self.running.add(task)
+                task.add_done_callback(self.running.discard)
+            delay = self._next_delay(now)
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _expire(self, on_expire, key):
+        try:
+            await on_expire(key)
+        except Exception as e:
+            print(f"Lỗi khi xử lý hạn chờ {key}: {e}")